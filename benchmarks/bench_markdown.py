@@ -0,0 +1,94 @@
+"""
+Measures the conversion of parsed pages to markdown: markdownify on the page
+serialized back to html, as the scraper used to do, against `to_markdown` on
+the parsed page. Also times the normalization of the text with chained
+`str.replace`, as `sanitize_strings` does, against a `str.translate` table.
+
+Usage:
+    python -m benchmarks.bench_markdown [PAGES] [--repeat N]
+
+PAGES is a directory of saved .html pages, a cache file written with `main.py --cache` or an
+archive written with `main.py --archive`, by default the benchmark fixtures.
+"""
+import argparse
+import time
+
+from markdownify import markdownify
+
+from benchmarks.bench_parsers import load_pages
+from benchmarks.make_fixtures import FIXTURES_DIR
+from page_markdown import PAGE_OPTIONS, to_markdown
+import page_parser
+from utils import sanitize_strings
+
+TRANSLATE_TABLE = str.maketrans({"\n": " ", "\u2019": "'", "\u2013": "-"})
+
+
+def reparsed(page) -> str:
+    return markdownify(str(page), **PAGE_OPTIONS)
+
+
+def bench_conversion(pages: list[bytes], convert, repeat: int) -> float:
+    """
+    Converts every page `repeat` times, a page is parsed again before every
+    conversion but only the conversion is timed.
+
+    Returns:
+        float: The average milliseconds per page
+    """
+    elapsed = 0.0
+    for _ in range(repeat):
+        for page in pages:
+            element = page_parser.parse_page(page)
+            if element is None:
+                continue
+            start = time.perf_counter()
+            convert(element)
+            elapsed += time.perf_counter() - start
+            page_parser.release_page(element)
+    return elapsed / (len(pages) * repeat) * 1000
+
+
+def bench_normalization(texts: list[str], normalize, repeat: int) -> float:
+    """
+    Returns:
+        float: The average microseconds per text
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            normalize(text)
+    return (time.perf_counter() - start) / (len(texts) * repeat) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the conversion of pages to markdown")
+    parser.add_argument("pages", nargs="?", default=FIXTURES_DIR,
+                        help="Directory of .html pages, a cache file or a page archive")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of passes over the pages")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        print(f"No pages found in {args.pages}")
+        return
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KB on average")
+
+    print(f"{'conversion':<24} {'ms/page':>10}")
+    for name, convert in (("markdownify(str(page))", reparsed), ("to_markdown(page)", to_markdown)):
+        print(f"{name:<24} {bench_conversion(pages, convert, args.repeat):>10.3f}")
+
+    texts = []
+    for page in pages:
+        element = page_parser.parse_page(page)
+        if element is not None:
+            texts.append(str(element))
+            page_parser.release_page(element)
+    print(f"{'normalization':<24} {'us/page':>10}")
+    for name, normalize in (("str.replace", sanitize_strings),
+                            ("str.translate", lambda text: text.translate(TRANSLATE_TABLE))):
+        print(f"{name:<24} {bench_normalization(texts, normalize, args.repeat * 100):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures how many pages per second every parser backend can turn into a
+`#page-content` element, with and without the restricted parse.
+
+Usage:
+    python -m benchmarks.bench_parsers [PAGES] [--repeat N]
+
+PAGES is a directory of saved .html pages, a cache file written with `main.py --cache` or an
+archive written with `main.py --archive`, by default the benchmark fixtures.
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import time
+
+from benchmarks.make_fixtures import FIXTURES_DIR
+import page_archive
+import page_parser
+
+
+def load_pages(source: str) -> list[bytes]:
+    """
+    Loads the pages to parse.
+
+    Args:
+        source: A directory of .html files, an `HTTPCache` file or a `PageArchive`
+
+    Returns:
+        list[bytes]: The html of every page
+    """
+    if os.path.isdir(source):
+        pages = []
+        for path in sorted(glob.glob(os.path.join(source, "*.html"))):
+            with open(path, "rb") as page_file:
+                pages.append(page_file.read())
+        return pages
+    if os.path.exists(page_archive.index_path(source)):
+        reader = page_archive.ArchiveReader(source)
+        try:
+            return [reader.get(url).body for url in reader.entries]
+        finally:
+            reader.close()
+    with sqlite3.connect(source) as db:
+        return [row[0] for row in db.execute("SELECT body FROM pages")]
+
+
+def bench(pages: list[bytes], backend: str, restricted: bool, repeat: int) -> float:
+    """
+    Parses every page `repeat` times.
+
+    Returns:
+        float: The number of pages parsed per second
+    """
+    page_parser.configure(backend, restricted)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            page_parser.parse_page(page)
+    return len(pages) * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the html parser backends")
+    parser.add_argument("pages", nargs="?", default=FIXTURES_DIR,
+                        help="Directory of .html pages, a cache file or a page archive")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of passes over the pages")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        print(f"No pages found in {args.pages}")
+        return
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KB on average")
+    print(f"{'backend':<12} {'mode':<11} {'pages/s':>10}")
+    for backend in page_parser.available_backends():
+        for restricted in (False, True):
+            rate = bench(pages, backend, restricted, args.repeat)
+            mode = "restricted" if restricted else "full"
+            print(f"{backend:<12} {mode:<11} {rate:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+End to end benchmark of `DNDScraper` against the local stand-in server.
+
+Every content type is scraped in its own process through the real `DNDScraper`
+path, and the benchmark reports pages/s, the time spent in every stage and the
+peak memory of the process.
+
+Usage:
+    python -m benchmarks.bench_scraper [--types spells feats magic_item] [--workers N] [--rate R]
+        [--adaptive] [--parsers N] [--latency S] [--error-rate P] [--capacity N]
+
+The stage times come from `metrics.METRICS` and are summed over the worker
+threads and parser processes, so they can add up to more than the wall time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stand_in_server import StandInServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TYPES = ("spells", "feats", "magic_item")
+STAGES = ("index", "fetch", "parse", "serialize", "write")
+
+
+def run_scraper(args: argparse.Namespace) -> dict:
+    """
+    Scrapes one content type in this process, the base url is already set in the environment.
+
+    Returns:
+        dict: The measurements of the run
+    """
+    import resource
+
+    import dnd_scraper
+    import fetcher
+    from metrics import METRICS
+    import page_parser
+
+    page_parser.configure(args.parser, args.restricted_parse)
+    page_fetcher = fetcher.Fetcher(args.workers, args.rate, retries=args.retries, backoff=args.backoff,
+                                   adaptive=args.adaptive)
+    start = time.perf_counter()
+    scraper = dnd_scraper.DNDScraper(args.run, page_fetcher, parsers=args.parsers)
+    elapsed = time.perf_counter() - start
+    scraper.close_file()
+    page_fetcher.close()
+
+    histograms = METRICS.to_dict()["histograms"]
+    return {
+        "pages": len(scraper.list_info),
+        "seconds": elapsed,
+        "stages": {stage: histograms[stage]["sum"] if stage in histograms else 0
+                   for stage in STAGES},
+        # kilobytes on linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def bench_type(content_type: str, server: StandInServer, args: argparse.Namespace) -> dict:
+    """
+    Runs the scraper for one content type in a new process and a scratch directory.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        result_path = os.path.join(work_dir, "result.json")
+        command = [sys.executable, "-m", "benchmarks.bench_scraper", "--run", content_type,
+                   "--result", result_path, "--workers", str(args.workers), "--rate", str(args.rate),
+                   "--parsers", str(args.parsers), "--parser", args.parser,
+                   "--retries", str(args.retries), "--backoff", str(args.backoff)]
+        if args.restricted_parse:
+            command.append("--restricted-parse")
+        if args.adaptive:
+            command.append("--adaptive")
+        env = dict(os.environ, DND_SCRAPER_BASE_URL=server.base_url,
+                   PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+        subprocess.run(command, cwd=work_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(result_path, encoding="utf-8") as result_file:
+            return json.load(result_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks DNDScraper against the stand-in server")
+    parser.add_argument("--types", nargs="+", choices=TYPES, default=list(TYPES))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0, help="Requests per second, 0 for no limit")
+    parser.add_argument("--adaptive", action="store_true", help="Adapt the concurrency and rate to the server")
+    parser.add_argument("--parsers", type=int, default=0)
+    parser.add_argument("--parser", default="html.parser")
+    parser.add_argument("--restricted-parse", action="store_true")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--capacity", type=int, default=0, help="Requests the server takes at once, 0 for no limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--run", choices=TYPES, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        with open(args.result, "w", encoding="utf-8") as result_file:
+            json.dump(run_scraper(args), result_file)
+        return
+
+    server = StandInServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           seed=args.seed, capacity=args.capacity).start()
+    print(f"workers={args.workers} rate={args.rate or 'unlimited'}{' adaptive' if args.adaptive else ''} "
+          f"parsers={args.parsers} "
+          f"parser={args.parser}{' restricted' if args.restricted_parse else ''} "
+          f"latency={args.latency}s error_rate={args.error_rate} capacity={args.capacity or 'unlimited'}")
+    print(f"{'type':<11} {'pages':>5} {'seconds':>8} {'pages/s':>8} "
+          + " ".join(f"{stage + ' s':>11}" for stage in STAGES) + f" {'peak MB':>8}")
+    for content_type in args.types:
+        result = bench_type(content_type, server, args)
+        stages = " ".join(f"{result['stages'][stage]:>11.2f}" for stage in STAGES)
+        print(f"{content_type:<11} {result['pages']:>5} {result['seconds']:>8.2f} "
+              f"{result['pages'] / result['seconds']:>8.1f} {stages} {result['peak_rss_kb'] / 1024:>8.1f}")
+    stats = server.stats
+    print(f"server: {stats.requests} requests, {stats.errors} errors injected, {stats.throttled} throttled, "
+          f"{stats.bytes_sent / 1024:.0f} KB sent")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures the lookups of `main.py serve`: requests over one keep-alive
+connection to a `LookupServer` holding the catalogue in memory, against
+reading the export from disk and searching it for every request, as clients
+reading `exported_*.json` themselves do.
+
+Usage:
+    python -m benchmarks.bench_serve [--spells N] [--requests N]
+
+The server runs in this process on a synthetic spell export written to a temporary directory.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+from export_writer import read_export
+from lookup_server import LookupServer, LookupService
+
+SCHOOLS = ("abjuration", "conjuration", "divination", "evocation")
+CLASSES = ("Bard", "Cleric", "Druid", "Sorcerer", "Warlock", "Wizard")
+
+
+def write_spells(path: str, count: int) -> list[str]:
+    """
+    Writes an export of `count` spells.
+
+    Returns:
+        list[str]: The names of the spells
+    """
+    records = [{
+        "name": f"Spell {i}", "description": "<p>" + "A flash of fire. " * 40 + "</p>", "level": i % 10,
+        "school": SCHOOLS[i % len(SCHOOLS)], "duration": "instantaneous", "is_concentration": i % 4 == 0,
+        "cast_type": "Action", "cast_time": 0, "is_ritual": i % 3 == 0, "range_type": "Units",
+        "spell_range": "150 unit", "has_upcast": False, "upcast": "", "components": ["Verbal", "Somatic"],
+        "component_material": "", "classes": [CLASSES[i % len(CLASSES)], CLASSES[(i * 7) % len(CLASSES)]],
+        "url": f"http://dnd5e.wikidot.com/spell:spell-{i}"} for i in range(count)]
+    with open(path, "w", encoding="utf-8") as export_file:
+        json.dump(records, export_file)
+    return [record["name"] for record in records]
+
+
+def percentiles(timings: list[float]) -> str:
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return f"{statistics.median(timings) * 1000:>8.3f} {p99 * 1000:>8.3f}"
+
+
+def bench_server(port: int, paths: list[str]) -> list[float]:
+    """
+    Requests every path in turn over one connection.
+
+    Returns:
+        list[float]: The seconds of every request
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        timings.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f"{path} answered {response.status}")
+    connection.close()
+    return timings
+
+
+def bench_reread(path: str, names: list[str]) -> list[float]:
+    """
+    Reads the export and searches it for every name.
+
+    Returns:
+        list[float]: The seconds of every lookup
+    """
+    timings = []
+    for name in names:
+        start = time.perf_counter()
+        next(record for record in read_export(path) if record["name"] == name)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the lookups of main.py serve")
+    parser.add_argument("--spells", type=int, default=500, help="Number of spells in the export")
+    parser.add_argument("--requests", type=int, default=2000, help="Number of requests of every kind")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # the service reads the exports from the working directory, like main.py
+        os.chdir(directory)
+        names = write_spells("exported_spells.json", args.spells)
+        service = LookupService(["spells"])
+        server = LookupServer(service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        picks = [names[(i * 7919) % len(names)] for i in range(args.requests)]
+        requests = {
+            "name": [f"/spells?name={quote(name)}" for name in picks],
+            "url": [f"/spells?url=/spell:spell-{name.split()[1]}" for name in picks],
+            "filter count": [f"/spells?level={i % 10}&classes=Wizard&count=true" for i in range(args.requests)],
+            "filter records": [f"/spells?level={i % 10}&classes=Wizard&is_ritual=true"
+                               for i in range(args.requests)],
+        }
+        print(f"{'lookup':<20} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, paths in requests.items():
+            print(f"{name:<20} {percentiles(bench_server(server.server_port, paths))}")
+        reread = bench_reread("exported_spells.json", picks[:max(1, args.requests // 20)])
+        print(f"{'re-read export':<20} {percentiles(reread)}")
+        server.shutdown()
+        server.server_close()
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Measures the extraction of the fields of spell pages: the single pass of
+`Spell._set_page_fields` against the passes the scraper used to make, which
+replaced the links of the whole page, took the details at a fixed position,
+serialized every paragraph back to html to find the end of the description
+and walked the sections again for the upcast and the classes.
+
+Only the extraction is timed, every page is parsed again before it. Both
+extractors have to find the same fields, the pages where they don't are counted.
+
+Usage:
+    python -m benchmarks.bench_spell_extract [PAGES] [--repeat N] [--parser NAME]
+
+PAGES is a directory of saved .html pages, a cache file written with `main.py --cache` or an
+archive written with `main.py --archive`, by default the benchmark fixtures. Only spell pages are used.
+"""
+import argparse
+import time
+
+from benchmarks.bench_parsers import load_pages
+from benchmarks.make_fixtures import FIXTURES_DIR
+from defaults import BACKENDS
+import page_parser
+from spell import (SPELL_CLASS_STARTING_TEXT, SPELL_DETAILS_STARTING_TEXT, UPCAST_STARTING_TEXT,
+                   ComponentTypes, Spell)
+from utils import sanitize_strings
+
+
+def multi_pass(spell: Spell, page) -> None:
+    """
+    Sets the fields of a spell the way `Spell` did before `_set_page_fields`.
+    """
+    for link in page.find_all('a'):
+        link.replace_with(link.text)
+    paragraphs = list(page.children)
+    spell._set_component_material(paragraphs[7].text)
+    for i in range(9, len(paragraphs)):
+        if any(end in str(paragraphs[i]) for end in (UPCAST_STARTING_TEXT, SPELL_CLASS_STARTING_TEXT)):
+            break
+    spell.description = sanitize_strings("".join(map(str, paragraphs[9:i])))
+    if paragraphs[i].text.strip().startswith(UPCAST_STARTING_TEXT):
+        spell._set_upcast(paragraphs[i].text)
+    for paragraph in paragraphs[i:]:
+        if paragraph.text.startswith(SPELL_CLASS_STARTING_TEXT):
+            spell._set_classes(paragraph.text)
+
+
+def single_pass(spell: Spell, page) -> None:
+    spell._set_page_fields(page)
+
+
+def extracted(spell: Spell) -> tuple:
+    return spell.description, spell.upcast, spell.has_upcast, spell.classes, spell.component_material
+
+
+def bench(pages: list[bytes], extract, repeat: int) -> tuple[float, list[tuple]]:
+    """
+    Extracts the fields of every page `repeat` times.
+
+    Returns:
+        tuple: The average milliseconds per page and the fields extracted from every page
+    """
+    elapsed = 0.0
+    fields = []
+    for _ in range(repeat):
+        fields = []
+        for page in pages:
+            element = page_parser.parse_page(page)
+            spell = Spell()
+            spell.components = (ComponentTypes.Material,)
+            start = time.perf_counter()
+            extract(spell, element)
+            elapsed += time.perf_counter() - start
+            fields.append(extracted(spell))
+            page_parser.release_page(element)
+    return elapsed / (len(pages) * repeat) * 1000, fields
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the extraction of the fields of spell pages")
+    parser.add_argument("pages", nargs="?", default=FIXTURES_DIR,
+                        help="Directory of .html pages, a cache file or a page archive")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of passes over the pages")
+    parser.add_argument("--parser", choices=BACKENDS, default=BACKENDS[0], help="BeautifulSoup backend")
+    args = parser.parse_args()
+
+    page_parser.configure(args.parser)
+    pages = [page for page in load_pages(args.pages) if SPELL_DETAILS_STARTING_TEXT.encode() in page]
+    if not pages:
+        print(f"No spell pages found in {args.pages}")
+        return
+    print(f"{len(pages)} spell pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KB on average")
+
+    print(f"{'extraction':<12} {'ms/page':>10}")
+    results = {}
+    for name, extract in (("multi pass", multi_pass), ("single pass", single_pass)):
+        elapsed, results[name] = bench(pages, extract, args.repeat)
+        print(f"{name:<12} {elapsed:>10.3f}")
+    different = sum(old != new for old, new in zip(results["multi pass"], results["single pass"]))
+    print(f"{different} of {len(pages)} pages extracted differently")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measures the start up of the command line: the wall time of `main.py --help`
+and of the commands that only read existing files, and which of the heavy
+dependencies every command imports.
+
+Usage:
+    python -m benchmarks.bench_startup [--repeat N]
+
+The commands run against a small export and queue written to a temporary directory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+HEAVY_MODULES = ("requests", "bs4", "tqdm", "markdownify", "numpy", "asyncio")
+
+# the importer runs main.py as `__main__` and reports the heavy modules it loaded
+REPORT_IMPORTS = f"""
+import runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules), file=sys.stderr)
+"""
+
+
+def write_inputs(directory: str) -> tuple[str, str]:
+    """
+    Writes a small spell export and an empty work queue.
+
+    Returns:
+        tuple[str, str]: The paths of the export and of the queue
+    """
+    export = os.path.join(directory, "exported_spells.jsonl")
+    with open(export, "w", encoding="utf-8") as export_file:
+        for i in range(50):
+            export_file.write(json.dumps({
+                "name": f"Spell {i}", "level": i % 10, "school": "Evocation", "classes": ["Wizard"],
+                "components": ["Verbal"], "is_ritual": i % 3 == 0, "is_concentration": False,
+                "cast_type": "Action", "range_type": "Ranged", "url": f"/spell:{i}"}) + "\n")
+    queue = os.path.join(directory, "crawl.db")
+    return export, queue
+
+
+def bench(arguments: list[str], repeat: int) -> tuple[float, str]:
+    """
+    Runs `main.py` with the arguments `repeat` times.
+
+    Returns:
+        tuple[float, str]: The average milliseconds per run and the heavy modules imported
+    """
+    command = [sys.executable, "-c", REPORT_IMPORTS, MAIN] + arguments
+    elapsed = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        elapsed += time.perf_counter() - start
+    modules = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+    return elapsed / repeat * 1000, modules or "-"
+
+
+def bench_import(module: str, repeat: int) -> float:
+    """
+    Returns:
+        float: The average milliseconds of starting the interpreter and importing a module,
+            e.g. `dnd_scraper`, which `main.py` used to import for every command
+    """
+    command = [sys.executable, "-c", f"import {module}" if module else "pass"]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        subprocess.run(command, cwd=os.path.dirname(MAIN))
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the start up of main.py")
+    parser.add_argument("--repeat", type=int, default=10, help="Number of runs of every command")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        export, queue = write_inputs(directory)
+        commands = {
+            "--help": ["--help"],
+            "query --count": ["query", export, "--where", "level=0-3", "--count"],
+            "queue status": ["queue", "status", queue],
+        }
+        print(f"{'command':<20} {'ms':>8}  heavy modules imported")
+        for name, arguments in commands.items():
+            elapsed, modules = bench(arguments, args.repeat)
+            print(f"{name:<20} {elapsed:>8.1f}  {modules}")
+    print(f"{'import dnd_scraper':<20} {bench_import('dnd_scraper', args.repeat):>8.1f}")
+    print(f"{'python -c pass':<20} {bench_import('', args.repeat):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Writes the wikidot stand-in pages used by the benchmarks into `benchmarks/fixtures`.
+
+The pages copy the markup of dnd5e.wikidot.com: the page chrome (header, side bar,
+scripts) around a `#page-content` holding the `/spells` and `/wondrous-items`
+tab views, the feats list under `#toc70` on the home page, and detail pages laid
+out the way `Spell`, `Feats` and `MagicItem` expect. The text is generated so the
+fixtures are small and deterministic.
+
+Usage:
+    python -m benchmarks.make_fixtures [--spells N] [--items N] [--feats N]
+"""
+import argparse
+import html
+import os
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+LEVELS = ["Cantrip", "1st Level", "2nd Level", "3rd Level", "4th Level", "5th Level"]
+SCHOOLS = ["Evocation", "Conjuration", "Abjuration", "Illusion",
+           "Necromancy", "Transmutation", "Divination", "Enchantment"]
+CAST_TIMES = ["1 Action", "1 Bonus Action", "1 Reaction", "1 Minute R",
+              "10 Minutes", "1 Hour R", "1 Action or 8 Hours"]
+RANGES = ["60 Feet", "Self", "Touch", "Self (15-foot cone)",
+          "120 Feet", "Sight", "1 Mile", "Special"]
+DURATIONS = ["Instantaneous", "Concentration, up to 1 minute", "1 Hour",
+             "Concentration, up to 10 minutes", "8 Hours"]
+COMPONENTS = ["V, S", "V, S, M", "V", "S, M", "V, M"]
+CLASSES = ["Artificer", "Bard", "Cleric", "Druid", "Paladin",
+           "Ranger", "Sorcerer", "Warlock", "Wizard"]
+RARITIES = ["Common", "Uncommon", "Rare", "Very Rare",
+            "Legendary", "Artifact", "Unique", "???"]
+ITEM_TYPES = ["Wondrous Item", "Armor", "Ring", "Potion",
+              "Weapon", "Staff", "Wand", "Rod", "Scroll"]
+SOURCES = ["DMG", "XGE", "TCE", "WDH", "ERLW", "FTD"]
+WORDS = ("a bright streak flashes from your pointing finger to a point you choose within range "
+         "and then blossoms with a low roar into an explosion of flame each creature in a "
+         "20-foot-radius sphere centered on that point must make a dexterity saving throw "
+         "target takes 8d6 fire damage on a failed save or half as much damage on a "
+         "successful one the fire spreads around corners and ignites flammable objects").split()
+SIDE_BAR = ["Races", "Backgrounds", "Feats", "Artificer", "Barbarian", "Bard", "Cleric",
+            "Druid", "Fighter", "Monk", "Paladin", "Ranger", "Rogue", "Sorcerer", "Warlock",
+            "Wizard", "Spells", "Magic Items", "Weapons", "Armor", "Adventuring Gear",
+            "Trinkets", "Firearms", "Explosives", "Poisons", "Tools", "Siege Equipment"]
+
+
+def sentence(seed: int, length: int) -> str:
+    return " ".join(WORDS[(seed * 7 + i * 3) % len(WORDS)] for i in range(length)).capitalize() + "."
+
+
+def page(title: str, content: str) -> str:
+    """
+    Wraps the content of a page in the wikidot page chrome.
+    """
+    side_bar = "\n".join(
+        f'<p><a href="/{name.lower().replace(" ", "-")}">{name}</a></p>' for name in SIDE_BAR)
+    return f'''<!DOCTYPE html>
+<html>
+<head>
+<title>{html.escape(title)} - DND 5th Edition</title>
+<script type="text/javascript" src="//d3g0gp89917ko0.cloudfront.net/v--edac79f846ba/common--javascript/init.combined.js"></script>
+<script type="text/javascript">
+var URL_HOST = 'www.wikidot.com';
+var URL_DOMAIN = 'wikidot.com';
+var USE_SSL = true;
+var URL_STATIC = '//d3g0gp89917ko0.cloudfront.net/v--edac79f846ba';
+WIKIREQUEST = {{}};
+WIKIREQUEST.info = {{}};
+WIKIREQUEST.info.domain = "dnd5e.wikidot.com";
+WIKIREQUEST.info.siteId = 1092847;
+WIKIREQUEST.info.pageUnixName = "{html.escape(title.lower())}";
+</script>
+<meta http-equiv="content-type" content="text/html;charset=UTF-8"/>
+<link rel="stylesheet" type="text/css" href="//d3g0gp89917ko0.cloudfront.net/v--edac79f846ba/common--theme/base/css/style.css"/>
+</head>
+<body id="html-body">
+<div id="skrollr-body">
+<div id="container-wrap-wrap">
+<div id="container-wrap">
+<div id="container">
+<div id="header">
+<h1><a href="/"><span>DND 5th Edition</span></a></h1>
+<div id="search-top-box" class="form-search">
+<form id="search-top-box-form" action="dummy" class="input-append"><input id="search-top-box-input" class="text empty search-query" type="text" size="15" name="query" value="Search this site"/><input class="button btn" type="submit" name="search" value="Search"/></form>
+</div>
+<div id="top-bar">
+<div class="top-bar">
+<ul>
+<li><a href="/">Home</a></li>
+<li><a href="javascript:;">Character</a><ul>{"".join(f'<li><a href="/{name.lower().replace(" ", "-")}">{name}</a></li>' for name in SIDE_BAR[:16])}</ul></li>
+<li><a href="javascript:;">Equipment</a><ul>{"".join(f'<li><a href="/{name.lower().replace(" ", "-")}">{name}</a></li>' for name in SIDE_BAR[16:])}</ul></li>
+</ul>
+</div>
+</div>
+</div>
+<div id="content-wrap">
+<div id="side-bar">
+<div class="side-block">
+<div class="heading"><p>Character</p></div>
+{side_bar}
+</div>
+</div>
+<div id="main-content">
+<div id="page-title">{html.escape(title)}</div>
+<div id="page-content">
+{content}
+</div>
+<div class="page-tags"><span><a href="/system:page-tags/tag/{html.escape(title.lower())}">{html.escape(title.lower())}</a></span></div>
+<div style="clear:both; height:1px; font-size:1px;"></div>
+<div id="page-info">page revision: 12, last edited: 1 Jan 2024 00:00</div>
+</div>
+</div>
+<div id="footer" style="display: block; visibility: visible;">
+<div class="options"><a href="http://www.wikidot.com/doc">Help</a> | <a href="http://www.wikidot.com/legal:terms-of-service">Terms of Service</a> | <a href="http://www.wikidot.com/legal:privacy-policy">Privacy</a></div>
+Powered by <a href="http://www.wikidot.com">Wikidot.com</a>
+</div>
+<div id="license-area" class="license-area">Unless otherwise stated, the content of this page is licensed under <a rel="license" href="http://creativecommons.org/licenses/by-sa/3.0/">Creative Commons Attribution-ShareAlike 3.0 License</a></div>
+</div>
+</div>
+</div>
+</div>
+<script type="text/javascript">OZONE.dom.onDomReady(function() {{ WIKIDOT.page.fixers.fixEmails(); }}, "dummy-ondomready-block");</script>
+</body>
+</html>
+'''
+
+
+def tab_view(tabs: list[str], boxes: list[str]) -> str:
+    """
+    Builds a wikidot tab view, like the ones on `/spells` and `/wondrous-items`.
+    """
+    selected = ' class="selected"'
+    hidden = ' style="display:none"'
+    nav = "".join(f'<li{selected if i == 0 else ""}><a href="javascript:;"><em>{tab}</em></a></li>'
+                  for i, tab in enumerate(tabs))
+    content = "".join(f'<div id="wiki-tab-0-{i}"{hidden if i else ""}>\n'
+                      f'<div class="list-pages-box">\n{box}</div>\n</div>\n'
+                      for i, box in enumerate(boxes))
+    return (f'<div id="wiki-tabview-1" class="yui-navset">\n<ul class="yui-nav">{nav}</ul>\n'
+            f'<div class="yui-content">\n{content}</div>\n</div>')
+
+
+def table(headers: list[str], rows: list[list[str]]) -> str:
+    head = "".join(f"<th>{header}</th>\n" for header in headers)
+    body = "".join("<tr>\n" + "".join(f"<td>{cell}</td>\n" for cell in row) + "</tr>\n"
+                   for row in rows)
+    return f'<table class="wiki-content-table">\n<tr>\n{head}</tr>\n{body}</table>\n'
+
+
+def spell_pages(count: int) -> dict[str, str]:
+    spells = []
+    for i in range(count):
+        spells.append({
+            "name": f"Spell {i:03d}" + (" (UA)" if i % 17 == 5 else ""),
+            "path": f"/spell:spell-{i:03d}",
+            "level": LEVELS[i % len(LEVELS)],
+            "school": SCHOOLS[i % len(SCHOOLS)],
+            "cast": CAST_TIMES[i % len(CAST_TIMES)],
+            "range": RANGES[i % len(RANGES)],
+            "duration": DURATIONS[i % len(DURATIONS)],
+            "components": COMPONENTS[i % len(COMPONENTS)],
+        })
+
+    boxes = []
+    for level in LEVELS:
+        rows = [[f'<a href="{s["path"]}">{s["name"]}</a>', s["school"], s["cast"], s["range"],
+                 s["duration"], s["components"]] for s in spells if s["level"] == level]
+        boxes.append('<div class="list-pages-item">\n' + table(
+            ["Spell Name", "School", "Casting Time", "Range", "Duration", "Components"], rows) + "</div>\n")
+    pages = {"/spells": page("Spells", tab_view(LEVELS, boxes))}
+
+    for i, s in enumerate(spells):
+        school = s["school"].lower()
+        level = f"{school} cantrip" if s["level"] == "Cantrip" else f'{s["level"].split()[0]}-level {school}'
+        components = s["components"]
+        if "M" in components:
+            components += f' (a pinch of <a href="/wondrous-items">powdered</a> iron worth {i} gp)'
+        description = "\n".join(f"<p>{sentence(i + p, 30 + p * 5)}</p>" for p in range(1 + i % 3))
+        if i % 4 == 1:
+            description += f"\n<ul>\n<li>{sentence(i, 12)}</li>\n<li>{sentence(i + 1, 10)}</li>\n</ul>"
+        if i % 3 == 0:
+            description += ("\n<p><strong><em>At Higher Levels.</em></strong> When you cast this spell using a "
+                            "spell slot of 4th level or higher, the damage increases by 1d6 for each slot "
+                            "level above 3rd.</p>")
+        classes = ", ".join(f'<a href="/spells:{c.lower()}">{c}</a>'
+                            for c in CLASSES[i % 9:i % 9 + 1 + i % 4])
+        if i % 6 == 2:
+            classes += ', <a href="/spells:wizard">Wizard (Optional)</a>'
+        content = f'''<div class="content-separator" style="display: none:"></div>
+<p>Source: Player's Handbook</p>
+<p><em>{level}</em></p>
+<p><strong>Casting Time:</strong> {s["cast"].lower()}<br />
+<strong>Range:</strong> {s["range"].lower()}<br />
+<strong>Components:</strong> {components}<br />
+<strong>Duration:</strong> {s["duration"]}</p>
+{description}
+<p><strong><em>Spell Lists.</em></strong> {classes}</p>'''
+        pages[s["path"]] = page(s["name"], content)
+    return pages
+
+
+def item_pages(count: int) -> dict[str, str]:
+    items = [{"name": f"Item {i:03d}", "path": f"/wondrous-items:item-{i:03d}",
+              "rarity": RARITIES[i % len(RARITIES)], "type": ITEM_TYPES[i % len(ITEM_TYPES)],
+              "source": SOURCES[i % len(SOURCES)]} for i in range(count)]
+
+    boxes = [table(["Item Name", "Type", "Source"],
+                   [[f'<a href="{item["path"]}">{item["name"]}</a>', item["type"], item["source"]]
+                    for item in items if item["rarity"] == rarity])
+             for rarity in RARITIES]
+    pages = {"/wondrous-items": page("Magic Items", tab_view(RARITIES, boxes))}
+
+    for i, item in enumerate(items):
+        attunement = " (requires attunement)" if i % 2 else ""
+        content = f'''<p>Source: Dungeon Master's Guide</p>
+<p><em>{item["type"]}, {item["rarity"].lower()}{attunement}</em></p>
+<p>{sentence(i, 40)}</p>
+<p><strong>{sentence(i + 2, 3)}</strong> {sentence(i + 3, 25)} See <a href="/spell:spell-{i:03d}">spell {i:03d}</a>.</p>
+{table(["d6", "Effect"], [["1", sentence(i, 6)], ["2", sentence(i + 1, 6)]])}<ul>
+<li>{sentence(i + 4, 8)}</li>
+<li><em>{sentence(i + 5, 8)}</em></li>
+</ul>'''
+        pages[item["path"]] = page(item["name"], content)
+    return pages
+
+
+def feat_pages(count: int) -> dict[str, str]:
+    feats = [{"name": f"Feat {i:03d}", "path": f"/feat:feat-{i:03d}"} for i in range(count)]
+    links = table(["Feat"], [[f'<a href="{feat["path"]}">{feat["name"]}</a>'] for feat in feats])
+    home = f'''<div class="row">
+<div class="col-md-4">
+<div class="feature">
+<h1 id="toc69"><span>Races</span></h1>
+<p><a href="/lineage">Lineages</a></p>
+</div>
+</div>
+</div>
+<div class="row">
+<div class="col-md-12">
+<div class="feature">
+<h1 id="toc70"><span>Feats</span></h1>
+{links}</div>
+</div>
+</div>'''
+    pages = {"/": page("Home", home)}
+
+    for i, feat in enumerate(feats):
+        prerequisite = "<p>Prerequisite: Strength 13 or higher</p>\n" if i % 2 else ""
+        content = f'''<p>Source: Player's Handbook</p>
+{prerequisite}<p>{sentence(i, 30)} You can move 30 feet further.</p>
+<ul>
+<li>{sentence(i + 1, 12)}</li>
+<li>{sentence(i + 2, 14)}</li>
+</ul>
+<p>{sentence(i + 3, 20)}</p>'''
+        pages[feat["path"]] = page(feat["name"], content)
+    return pages
+
+
+def fixture_name(path: str) -> str:
+    """
+    Gets the file name of the fixture for a url path, e.g. `spell__fireball.html` for `/spell:fireball`.
+    """
+    return (path.strip("/").replace(":", "__") or "index") + ".html"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes the benchmark fixtures")
+    parser.add_argument("--spells", type=int, default=30)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--feats", type=int, default=20)
+    parser.add_argument("--out", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    pages = spell_pages(args.spells) | item_pages(args.items) | feat_pages(args.feats)
+    for path, body in pages.items():
+        with open(os.path.join(args.out, fixture_name(path)), "w", encoding="utf-8", newline="\n") as page_file:
+            page_file.write(body)
+    print(f"Wrote {len(pages)} pages to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+A local stand-in for dnd5e.wikidot.com that serves the benchmark fixtures.
+
+Every response can be delayed by `latency` seconds (plus up to `jitter` seconds)
+and a share `error_rate` of the requests is answered with a 503, so retries and
+throttling can be measured without touching the real site. With a `capacity`,
+requests beyond that many at once are answered with a 429 and a `Retry-After`.
+Pages are sent with an `ETag`, and `If-None-Match` is answered with a 304.
+
+Usage:
+    python -m benchmarks.stand_in_server [--port 8000] [--latency 0.05] [--error-rate 0.01]
+
+Then point the scraper at it with `DND_SCRAPER_BASE_URL=http://127.0.0.1:8000`.
+"""
+import argparse
+from dataclasses import dataclass, field
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import random
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+from benchmarks.make_fixtures import FIXTURES_DIR, fixture_name
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    not_modified: int = 0
+    bytes_sent: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, status: int, size: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += size
+            if status == 304:
+                self.not_modified += 1
+            elif status == 429:
+                self.throttled += 1
+            elif status >= 500:
+                self.errors += 1
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, fixtures: str = FIXTURES_DIR, latency: float = 0,
+                 jitter: float = 0, error_rate: float = 0, seed: (int | None) = None,
+                 capacity: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.active = 0
+        self.active_lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.stats = ServerStats()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self) -> "StandInServer":
+        """
+        Serves requests on a background thread.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def do_GET(self):
+        server = self.server
+        with server.active_lock:
+            server.active += 1
+            overloaded = server.capacity and server.active > server.capacity
+        try:
+            if overloaded:
+                self._send(429, b"Too Many Requests", {"Retry-After": "1"})
+            else:
+                self._serve()
+        finally:
+            with server.active_lock:
+                server.active -= 1
+
+    def _serve(self):
+        server = self.server
+        delay = server.latency + server.jitter * server.random.random()
+        if delay:
+            time.sleep(delay)
+
+        if server.random.random() < server.error_rate:
+            self._send(503, b"Service Unavailable", {"Retry-After": "1"})
+            return
+
+        path = os.path.join(server.fixtures, fixture_name(unquote(urlsplit(self.path).path)))
+        if not os.path.isfile(path):
+            self._send(404, b"Not Found")
+            return
+        with open(path, "rb") as page_file:
+            body = page_file.read()
+
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", {"ETag": etag})
+            return
+        self._send(200, body, {"ETag": etag, "Content-Type": "text/html; charset=utf-8"})
+
+    def _send(self, status: int, body: bytes, headers: (dict[str, str] | None) = None) -> None:
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats.count(status, len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves the benchmark fixtures like dnd5e.wikidot.com")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--latency", type=float, default=0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0, help="Up to this many extra seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of requests answered with a 503")
+    parser.add_argument("--capacity", type=int, default=0, help="Requests served at once, the others get a 429")
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, args.fixtures, args.latency, args.jitter, args.error_rate,
+                           capacity=args.capacity)
+    print(f"Serving {args.fixtures} on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+
+import numpy as np
+
+from magic_item import Rarity, Source, Type
+from spell import CastType, ClassTypes, ComponentTypes, SpellRangeType
+
+SCHEMA_FILE = "schema.json"
+STRINGS_FILE = "strings.npy"
+STRING_OFFSETS_FILE = "string_offsets.npy"
+
+# (column, field of the exported record, kind) for every record type, the kinds are:
+# "text": index into the shared string table, "bool", "int8"/"int32": the number as is,
+# "units": the first number of the field (-1 when there is none),
+# an enum: the position of the member in the enum, ("set", enum): one bit per member of the enum
+SCHEMAS = {
+    "Spell": (
+        ("name", "name", "text"),
+        ("description", "description", "text"),
+        ("level", "level", "int8"),
+        ("school", "school", "text"),
+        ("duration", "duration", "text"),
+        ("is_concentration", "is_concentration", "bool"),
+        ("cast_type", "cast_type", CastType),
+        ("cast_time", "cast_time", "int32"),
+        ("is_ritual", "is_ritual", "bool"),
+        ("range_type", "range_type", SpellRangeType),
+        ("spell_range", "spell_range", "text"),
+        ("range_units", "spell_range", "units"),
+        ("has_upcast", "has_upcast", "bool"),
+        ("upcast", "upcast", "text"),
+        ("components", "components", ("set", ComponentTypes)),
+        ("component_material", "component_material", "text"),
+        ("classes", "classes", ("set", ClassTypes)),
+        ("url", "url", "text"),
+    ),
+    "MagicItem": (
+        ("name", "name", "text"),
+        ("rarity", "rarity", Rarity),
+        ("type", "type", Type),
+        ("source", "source", Source),
+        ("attuned", "attuned", "bool"),
+        ("text", "text", "text"),
+        ("url", "url", "text"),
+    ),
+    "Feats": (
+        ("name", "name", "text"),
+        ("description", "description", "text"),
+        ("prerequisite", "prerequisite", "text"),
+        ("url", "url", "text"),
+        ("has_prerequisite", "has_prerequisite", "bool"),
+    ),
+}
+
+
+def columns_path(export_file: str) -> str:
+    """
+    Gets the directory of the columnar copy of an export, e.g. `exported_spells.columns`.
+    """
+    root, _ = os.path.splitext(export_file)
+    return f'{root}.columns'
+
+
+def enum_codes(enum) -> dict[str, int]:
+    """
+    Gets the code of every member name of an enum, aliases share the code of their member.
+    """
+    positions = {member: i for i, member in enumerate(enum)}
+    return {name: positions[member] for name, member in enum.__members__.items()}
+
+
+def _units(value: str) -> int:
+    number = re.search(r'\d+', value)
+    return int(number[0]) if number else -1
+
+
+def write_columns(records: list[dict], record_type: str, path: str) -> None:
+    """
+    Writes exported records as one `.npy` file per column in the directory `path`.
+
+    Text is stored once in a shared UTF-8 string table, enums as small integer
+    codes and sets of enums as bit masks, so the catalogue can be memory mapped
+    with `Catalogue` and filtered with NumPy without building any dicts.
+
+    Args:
+        records: The records of an export, as loaded from JSON
+        record_type: The class the records were made with, a key of `SCHEMAS`
+        path: The directory to write to, created if needed
+    """
+    os.makedirs(path, exist_ok=True)
+    strings: dict[str, int] = {}
+    schema = {"type": record_type, "count": len(records), "columns": {}}
+
+    for column, record_field, kind in SCHEMAS[record_type]:
+        values = [record[record_field] for record in records]
+        if kind == "text":
+            array = np.array([strings.setdefault(value, len(strings)) for value in values],
+                             dtype=np.int32)
+            description = {"kind": "text"}
+        elif kind == "bool":
+            array = np.array(values, dtype=np.bool_)
+            description = {"kind": "bool"}
+        elif kind == "units":
+            array = np.array([_units(value) for value in values], dtype=np.int32)
+            description = {"kind": "int", "from": record_field}
+        elif isinstance(kind, str):
+            array = np.array(values, dtype=kind)
+            description = {"kind": "int"}
+        elif isinstance(kind, tuple):
+            codes = enum_codes(kind[1])
+            array = np.array([sum(1 << codes[name] for name in set(value)) for value in values],
+                             dtype=np.uint16)
+            description = {"kind": "set", "values": [member.name for member in kind[1]]}
+        else:
+            codes = enum_codes(kind)
+            array = np.array([codes[value] for value in values], dtype=np.uint8)
+            description = {"kind": "enum", "values": [member.name for member in kind]}
+        np.save(os.path.join(path, f'{column}.npy'), array)
+        schema["columns"][column] = description
+
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    np.save(os.path.join(path, STRINGS_FILE), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, STRING_OFFSETS_FILE), offsets)
+    # written last, a directory without a schema is an unfinished export
+    with open(os.path.join(path, SCHEMA_FILE), "w", encoding="utf-8") as schema_file:
+        json.dump(schema, schema_file, indent=2)
+
+
+class Catalogue:
+    """
+    A columnar export written by `write_columns`, with every column memory mapped
+    as a read only NumPy array, e.g. the rituals of level 3 or lower:
+
+        spells = Catalogue("exported_spells.columns")
+        rows = np.flatnonzero(spells["is_ritual"] & (spells["level"] <= 3))
+    """
+
+    def __init__(self, path: str, mmap: bool = True) -> None:
+        with open(os.path.join(path, SCHEMA_FILE), encoding="utf-8") as schema_file:
+            self.schema = json.load(schema_file)
+        mmap_mode = "r" if mmap else None
+        self.columns = {column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mmap_mode)
+                        for column in self.schema["columns"]}
+        self.strings = np.load(os.path.join(path, STRINGS_FILE), mmap_mode=mmap_mode)
+        self.string_offsets = np.load(os.path.join(path, STRING_OFFSETS_FILE), mmap_mode=mmap_mode)
+
+    def __len__(self) -> int:
+        return self.schema["count"]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def code(self, column: str, name: str) -> int:
+        """
+        Gets the code of an enum member in an enum column, or its bit in a set column.
+
+        Raises:
+            ValueError: Raises an error if the member isn't a value of the column
+        """
+        description = self.schema["columns"][column]
+        position = description["values"].index(name)
+        return 1 << position if description["kind"] == "set" else position
+
+    def string(self, index: int) -> str:
+        """
+        Gets a string of the string table.
+        """
+        start, end = self.string_offsets[index], self.string_offsets[index + 1]
+        return self.strings[start:end].tobytes().decode("utf-8")
+
+    def record(self, row: int) -> dict:
+        """
+        Decodes one row back into the record it was written from.
+
+        Args:
+            row: The position of the record in the export
+
+        Returns:
+            dict: The record as found in the JSON export, with sets in the order of their enum
+        """
+        record = {}
+        for column, description in self.schema["columns"].items():
+            if "from" in description:
+                continue
+            value = self.columns[column][row]
+            match description["kind"]:
+                case "text":
+                    record[column] = self.string(value)
+                case "bool":
+                    record[column] = bool(value)
+                case "int":
+                    record[column] = int(value)
+                case "enum":
+                    record[column] = description["values"][value]
+                case "set":
+                    record[column] = [name for i, name in enumerate(description["values"])
+                                      if value >> i & 1]
+        return record
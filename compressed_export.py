@@ -0,0 +1,194 @@
+from collections.abc import Iterator
+from functools import lru_cache
+import gzip
+import json
+import mmap
+import os
+
+from export_writer import ExportWriter
+
+# export format -> codec of its frames
+CODECS = {"jsonl.gz": "gzip", "jsonl.zst": "zstd"}
+# records compressed together, a lookup decodes the whole frame of its record
+DEFAULT_FRAME_RECORDS = 16
+DEFAULT_CACHED_FRAMES = 8
+
+_MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+
+
+def index_path(export_path: str) -> str:
+    """
+    Gets the path of the offset index of a compressed export, e.g. `exported_spells.jsonl.gz.idx`.
+    """
+    return export_path + ".idx"
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    """
+    Compresses data into one frame that can be decompressed on its own.
+    """
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, mtime=0)
+
+
+def decompress(codec: str, frame: bytes) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(frame)
+    return gzip.decompress(frame)
+
+
+class CompressedWriter(ExportWriter):
+    """
+    Writes JSON Lines compressed in frames of `frame_records` records, every
+    frame a gzip member or a zstd frame of its own. The whole file is still a
+    valid `.gz`/`.zst` of the JSON Lines.
+
+    For every frame a line is appended to the offset index `<path>.idx` with
+    the byte range of the frame and the url and name of its records, so
+    `CompressedExport` can decode a single record without reading the rest.
+    The index is also the checkpoint of the export: resuming cuts the export
+    back to the last frame in the index.
+    """
+
+    def __init__(self, path: str, codec: str = "gzip", resume: bool = False,
+                 frame_records: int = DEFAULT_FRAME_RECORDS) -> None:
+        self.codec = codec
+        self.frame_records = frame_records
+        self.index_path = index_path(path)
+        self.index = None
+        self.frame: list[tuple[str, str, str]] = []
+        super().__init__(path, resume)
+
+    def _start(self) -> None:
+        self.file = open(self.path, "wb")
+        self.index = open(self.index_path, "w", encoding='utf-8')
+
+    def _resume(self) -> None:
+        lines = []
+        offset = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as index:
+                for line in index:
+                    if not line.endswith("\n"):
+                        break
+                    entry = json.loads(line)
+                    lines.append(line)
+                    offset = entry["offset"] + entry["length"]
+                    self.written.update(url for url, _ in entry["records"])
+        # drop the frame and index line the previous run was writing when it stopped
+        self.file = open(self.path, "r+b")
+        self.file.seek(offset)
+        self.file.truncate()
+        self.index = open(self.index_path, "w", encoding='utf-8')
+        self.index.writelines(lines)
+        self.index.flush()
+
+    def write(self, url: str, record: str) -> None:
+        self.frame.append((url, json.loads(record).get("name", ""), record))
+        self.written.add(url)
+        if len(self.frame) >= self.frame_records:
+            self._write_frame()
+
+    def _write_frame(self) -> None:
+        if not self.frame:
+            return
+        data = compress(self.codec, "".join(record + "\n" for _, _, record in self.frame).encode("utf-8"))
+        offset = self.file.tell()
+        self.file.write(data)
+        self.file.flush()
+        self.index.write(json.dumps({"offset": offset, "length": len(data),
+                                     "records": [[url, name] for url, name, _ in self.frame]},
+                                    ensure_ascii=False) + "\n")
+        self.index.flush()
+        self.frame.clear()
+
+    def finish(self) -> None:
+        self._write_frame()
+        self.close()
+
+    def close(self) -> None:
+        # records of an unfinished frame are scraped again when resuming
+        super().close()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+
+class CompressedExport:
+    """
+    Reads records of a compressed export by url or by name. The export is
+    memory mapped and only the frames of the requested records are decoded,
+    the last `cached_frames` of them are kept decoded:
+
+        with CompressedExport("exported_spells.jsonl.gz") as spells:
+            fireball = spells.get("http://dnd5e.wikidot.com/spell:fireball")
+            shields = spells.find("Shield")
+    """
+
+    def __init__(self, path: str, cached_frames: int = DEFAULT_CACHED_FRAMES) -> None:
+        self.path = path
+        self.frames: list[tuple[int, int]] = []
+        self.urls: dict[str, tuple[int, int]] = {}
+        self.names: dict[str, list[str]] = {}
+        with open(index_path(path), encoding='utf-8') as index:
+            for line in index:
+                if not line.endswith("\n"):
+                    break
+                entry = json.loads(line)
+                for position, (url, name) in enumerate(entry["records"]):
+                    self.urls[url] = (len(self.frames), position)
+                    self.names.setdefault(name, []).append(url)
+                self.frames.append((entry["offset"], entry["length"]))
+
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.codec = next((codec for magic, codec in _MAGIC.items() if self._data[:len(magic)] == magic), "gzip")
+        self._frame = lru_cache(maxsize=cached_frames)(self._decode_frame)
+
+    def __enter__(self) -> "CompressedExport":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.urls
+
+    def __iter__(self) -> Iterator[dict]:
+        for frame in range(len(self.frames)):
+            yield from (json.loads(line) for line in self._decode_frame(frame))
+
+    def _decode_frame(self, frame: int) -> list[str]:
+        offset, length = self.frames[frame]
+        # not splitlines, which also splits at separators left unescaped in the records
+        return decompress(self.codec, self._data[offset:offset + length]).decode("utf-8").split("\n")[:-1]
+
+    def get(self, url: str) -> (dict | None):
+        """
+        Gets the record of a url.
+
+        Returns:
+            dict | None: The record, None if the export doesn't have the url
+        """
+        if url not in self.urls:
+            return None
+        frame, position = self.urls[url]
+        return json.loads(self._frame(frame)[position])
+
+    def find(self, name: str) -> list[dict]:
+        """
+        Gets the records with a name, in the order of the export.
+        """
+        return [self.get(url) for url in self.names.get(name, [])]
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
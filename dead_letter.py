@@ -0,0 +1,119 @@
+from collections.abc import Container, Iterable
+from datetime import datetime, timezone
+import json
+import os
+import threading
+
+from incremental import row_url
+
+
+def dead_letter_path(export_path: str) -> str:
+    """
+    Gets the path of the failed rows of an export, e.g. `exported_spells.failed.jsonl`.
+    """
+    root, _ = os.path.splitext(export_path)
+    return f'{root}.failed.jsonl'
+
+
+class DeadLetters:
+    """
+    The index rows whose page couldn't be scraped, with the reason, kept in a
+    JSON Lines file next to the export so they can be retried on their own with
+    `--retry-failed`. Without a path the rows are only kept in memory.
+
+    A failure is appended to the file as it happens, the last line of a url
+    being the one that counts, and `finish` rewrites the file once with only
+    the rows that still failed.
+    """
+
+    def __init__(self, path: (str | None) = None) -> None:
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._torn = False
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as dead_letter_file:
+                for line in dead_letter_file:
+                    if line.endswith("\n"):
+                        entry = json.loads(line)
+                        self.entries[entry["url"]] = entry
+                    else:
+                        self._torn = True
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, row: dict[str, str], error: Exception, position: (int | None) = None) -> None:
+        """
+        Records a failed row, replacing an earlier failure of the same row.
+
+        Args:
+            row: The index row
+            error: Why the row failed
+            position: The position of the row in its index, used to put the record back in place once it's retried
+        """
+        url = row_url(row)
+        with self._lock:
+            previous = self.entries.get(url, {})
+            self.entries[url] = {
+                "url": url,
+                "row": row,
+                "position": position if position is not None else previous.get("position"),
+                "reason": f'{type(error).__name__}: {error}',
+                "failed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "attempts": previous.get("attempts", 0) + 1,
+            }
+            if self.path:
+                if self._file is None:
+                    if self._torn:
+                        # an interrupted run left half a line, appending to it would garble the next one
+                        self._save()
+                        self._torn = False
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps(self.entries[url], ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def update(self, entries: Iterable[dict]) -> None:
+        """
+        Adds entries as they are, e.g. the failed rows of other dead-letter files.
+        """
+        with self._lock:
+            for entry in entries:
+                self.entries[entry["url"]] = entry
+            self._save()
+
+    def resolve(self, url: str) -> None:
+        """
+        Forgets a row once it was scraped, the file keeps it until `finish`.
+        """
+        with self._lock:
+            self.entries.pop(url, None)
+
+    def finish(self, urls: (Container[str] | None) = None) -> None:
+        """
+        Rewrites the file with the rows that still failed.
+
+        Args:
+            urls: The urls of the index, the rows of other urls left the index and are dropped
+        """
+        with self._lock:
+            if urls is not None:
+                self.entries = {url: entry for url, entry in self.entries.items() if url in urls}
+            self._save()
+
+    def _save(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self.path:
+            return
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, "w", encoding="utf-8") as dead_letter_file:
+            for entry in self.entries.values():
+                dead_letter_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,29 @@
+# Defaults and choices of the command line, shared with the modules using them.
+# Nothing else is imported here, so `main.py --help` and the commands that only
+# read exports start without loading requests, bs4 and the content modules.
+
+# seconds between two requests of the default fetcher
+INTERVAL = 2
+
+DEFAULT_WORKERS = 1
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+# requests per second the adaptive controller can grow to
+DEFAULT_MAX_RATE = 20
+
+DEFAULT_BACKEND = "html.parser"
+BACKENDS = ("html.parser", "lxml", "html5lib")
+# how the descriptions of spells and feats are exported
+TEXT_FORMATS = ("html", "markdown")
+# bytes of pages kept by `--cache`
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+# bytes of parsed fields kept by `--parse-cache`
+DEFAULT_PARSE_CACHE_SIZE = 64 * 1024 * 1024
+
+DEFAULT_BATCH_SIZE = 20
+# seconds a claimed batch stays with its worker before others can claim it again
+DEFAULT_LEASE = 300
+
+# port of the `serve` command and seconds between two scrapes refreshing what it serves
+DEFAULT_PORT = 8080
+DEFAULT_RESCRAPE_INTERVAL = 24 * 60 * 60
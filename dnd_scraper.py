@@ -1,72 +1,228 @@
 # coding=utf8
+import asyncio
 from pprint import pprint
+from typing import AsyncIterator, Iterator
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup, ResultSet
-import requests
 from feats import Feats
-from spell import Spell
+from spell import Spell, rederive_spell_fields
 from magic_item import MagicItem
 import json
+import os
 
-import time
 from tqdm import tqdm
 
+from dead_letter import DeadLetters, dead_letter_path
+from defaults import INTERVAL
+from export_writer import export_format, export_path, open_export, read_export, replace_export
+from fetcher import DEFAULT_FETCHER, Fetcher
+from incremental import load_previous_export, row_fingerprint, row_url, save_fingerprints
+from metrics import METRICS, timed
+from page_parser import parse_page, release_page
+from pipeline import Pipeline
+from sqlite_export import SQLiteExport
 from utils import BASE_URL
 
-INTERVAL = 2
+# content type -> (index page, export file, class of the records)
+CONTENT_TYPES = {
+    "feats": ("/#toc70", "exported_feats.json", Feats),
+    "magic_item": ("/wondrous-items", "exported_magic_items.json", MagicItem),
+    "spells": ("/spells", "exported_spells.json", Spell),
+}
+
+
+def index_url(type_grab: str) -> str:
+    """
+    Gets the url of the index page of a content type.
+    """
+    return urljoin(BASE_URL, CONTENT_TYPES[type_grab][0])
+
+
+def index_dump_path(export_path: str) -> str:
+    """
+    Gets the path of the index rows dumped next to an export, e.g. `spells.json`
+    for `exported_spells.json` or `exported_spells.jsonl.gz`.
+    """
+    directory, name = os.path.split(export_path)
+    return os.path.join(directory, name.split(".")[0].removeprefix("exported_") + ".json")
 
 
 class DNDScraper:
-    def __init__(self, type_grab: (str | None) = None):
-        if type_grab == "feats":
-            self.url = urljoin(BASE_URL, "/#toc70")
-            self.file = open("exported_feats.json", "w", encoding='utf-8')
-            self.list_info = get_feats_urls(self.url)
-            self.class_parse = Feats
-        elif type_grab == 'magic_item':
-            self.url = urljoin(BASE_URL, "/wondrous-items")
-            self.file = open("exported_magic_items.json",
-                             "w", encoding='utf-8')
+    """
+    Scrapes one content type. By default everything is scraped to the export
+    right away, with `scrape=False` the records can be consumed one at a time
+    with `records` or `arecords` instead:
+
+        scraper = DNDScraper("spells", scrape=False, dump_index=False)
+        for spell in scraper.records(max_in_flight=4):
+            ...
+    """
+
+    def __init__(self, type_grab: (str | None) = None, fetcher: (Fetcher | None) = None,
+                 incremental: bool = False, parsers: int = 0, resume: bool = False,
+                 output_format: str = "json", sqlite: (SQLiteExport | None) = None,
+                 dump_index: bool = True, scrape: bool = True, output_dir: (str | None) = None):
+        self.fetcher = fetcher or Fetcher(rate=1 / INTERVAL)
+        # default is spells
+        _, export_file, self.class_parse = CONTENT_TYPES.get(type_grab, CONTENT_TYPES["spells"])
+        self.url = index_url(type_grab if type_grab in CONTENT_TYPES else "spells")
+        self.file_name = export_path(export_file, output_format, output_dir)
+        if self.class_parse is Feats:
+            self.list_info = get_feats_urls(self.url, self.fetcher)
+        else:
             self.list_info = self.get_wiki_table()
-            self.class_parse = MagicItem
+        self.positions = {row_url(info): i for i, info in enumerate(self.list_info)}
+        # rows that fail are kept in `<export>.failed.jsonl` for `retry_failed`
+        self.dead_letters = DeadLetters(dead_letter_path(self.file_name) if scrape else None)
 
-            with open('./magic_items.json', 'w') as outputFile:
+        # for spells, the fields from the index can be re-derived from the dump with `rederive_spell_fields`
+        if dump_index and self.class_parse is not Feats:
+            with open(index_dump_path(self.file_name), 'w') as outputFile:
                 json.dump(self.list_info, outputFile)
+
+        if scrape:
+            self.scrape(incremental, parsers, resume, output_format, sqlite)
+
+    def scrape(self, incremental: bool = False, parsers: int = 0, resume: bool = False,
+               output_format: str = "json", sqlite: (SQLiteExport | None) = None) -> None:
+        """
+        Scrapes every row of the index to the export `self.file_name`.
+
+        Args:
+            incremental: Keep the records of the last export whose index row hasn't changed
+            parsers: Number of processes parsing the pages, 0 parses them in the fetcher workers
+            resume: Keep the records written by an interrupted scrape and continue from there
+            output_format: One of `export_writer.FORMATS`
+            sqlite: An export the records are written to as well
+        """
+        # records of the last export whose index row hasn't changed are kept as is
+        self.previous = load_previous_export(
+            self.file_name) if incremental else {}
+        self.fingerprints = {row_url(info): row_fingerprint(info)
+                             for info in self.list_info}
+
+        self.writer = open_export(self.file_name, output_format, resume)
+        # rows already written by an interrupted run are skipped
+        rows = [info for info in self.list_info
+                if row_url(info) not in self.writer.written]
+        progress_bar = tqdm(total=len(self.list_info),
+                            initial=len(self.list_info) - len(rows),
+                            desc=self.class_parse.__name__)
+        if parsers:
+            records = Pipeline(self.class_parse, self.fetcher, parsers).run(
+                rows, self.previous_record, self.add_failed)
         else:
-            # default is spells
-            self.url = urljoin(BASE_URL, "/spells")
-            self.file = open("exported_spells.json", "w", encoding='utf-8')
-            self.list_info = self.get_wiki_table()
-            self.class_parse = Spell
-
-        self.file.write("[\n")
-        progress_bar = tqdm(total=len(self.list_info))
-        for i, info in enumerate(self.list_info):
-            if i != 0:
-                self.file.write(", ")
-            files = self.class_parse(info).to_json_str()
-            self.file.write(files + "\n")
-            time.sleep(INTERVAL)
+            records = self.fetcher.map(self.scrape_row, rows)
+        for info, record in zip(rows, records):
             progress_bar.update(1)
-        self.file.write("]")
+            if record is None:
+                continue
+            self.dead_letters.resolve(row_url(info))
+            with METRICS.timer("write"):
+                self.writer.write(row_url(info), record)
+                if sqlite:
+                    sqlite.write(self.class_parse.__name__, record)
+            METRICS.incr("records")
+        self.writer.finish()
+        # the failures of rows that left the index aren't retried anymore
+        self.dead_letters.finish(self.positions)
+        if sqlite:
+            # the database keeps the same records as the export, e.g. without the rows that left the index
+            sqlite.prune(self.class_parse.__name__, self.writer.written)
+        save_fingerprints(self.file_name, self.fingerprints)
+
+    def records(self, max_in_flight: (int | None) = None) -> Iterator[Spell | Feats | MagicItem]:
+        """
+        Scrapes the rows of the index lazily, without writing any export.
+
+        Args:
+            max_in_flight: Most pages being fetched or parsed ahead of the consumer,
+                defaults to twice the workers of the fetcher
+
+        Returns:
+            Iterator: The scraped records, in the order of the index, without the
+                rows that failed, which are kept in `self.dead_letters`
+        """
+        records = self.fetcher.map(self._scrape_record, self.list_info, max_in_flight)
+        return (record for record in records if record is not None)
+
+    async def arecords(self, max_in_flight: (int | None) = None) -> AsyncIterator[Spell | Feats | MagicItem]:
+        """
+        Like `records`, for asyncio: the pages are scraped on the fetcher workers
+        while the event loop keeps running.
+        """
+        loop = asyncio.get_running_loop()
+        records = self.records(max_in_flight)
+        try:
+            while (record := await loop.run_in_executor(None, next, records, None)) is not None:
+                yield record
+        finally:
+            await loop.run_in_executor(None, records.close)
+
+    def _scrape_record(self, info: dict[str, str]) -> (Spell | Feats | MagicItem | None):
+        try:
+            return self.class_parse(info, fetcher=self.fetcher)
+        except Exception as e:
+            self.add_failed(info, e)
+            return None
+
+    def add_failed(self, info: dict[str, str], error: Exception) -> None:
+        """
+        Records a row that couldn't be scraped as a dead letter.
+        """
+        METRICS.incr("records.failed")
+        self.dead_letters.add(info, error, self.positions.get(row_url(info)))
+
+    def scrape_row(self, info: dict[str, str]) -> (str | None):
+        """
+        Scrapes the detail page of an index row, unless the row is unchanged
+        since the previous export.
+
+        Args:
+            info: A row from the index page
+
+        Returns:
+            str | None: The record as a JSON string, None if the row failed
+        """
+        previous = self.previous_record(info)
+        if previous is not None:
+            return previous
+        record = self._scrape_record(info)
+        return record.to_json_str() if record is not None else None
+
+    def previous_record(self, info: dict[str, str]) -> (str | None):
+        """
+        Looks up the record of an index row in the previous export.
+
+        Args:
+            info: A row from the index page
+
+        Returns:
+            str | None: The previous record as a JSON string, or None if the row is new or changed
+        """
+        url = row_url(info)
+        previous = self.previous.get(url)
+        if previous is not None and previous[0] == self.fingerprints[url]:
+            return previous[1]
+        return None
 
     def close_file(self):
-        if hasattr(self, 'file') and self.file:
-            self.file.close()
+        if hasattr(self, 'writer') and self.writer:
+            self.writer.close()
 
     def print_spells(self):
         for i in self.spells:
             pprint(self.spells[i])
 
+    @timed("index")
     def get_wiki_table(self) -> list[dict[str, str]]:
         '''
         Extracts all the tables from the main page, given by `self.url`
         '''
-        main_page = requests.get(self.url)
+        main_page = self.fetcher.get(self.url)
         if main_page.status_code != 200:
             raise LookupError(f'Could not connect to {self.url}')
 
-        soup = BeautifulSoup(main_page.content, 'html.parser')
+        soup = parse_page(main_page.content)
 
         table_categories = soup.find('ul', class_='yui-nav').find_all('li')
         categories_names = []
@@ -92,25 +248,132 @@ class DNDScraper:
                 row_dict['category'] = category
                 table_list.append(row_dict)
 
+        release_page(soup)
         return table_list
 
 
-def get_feats_urls(url: str) -> list[ResultSet]:
+@timed("index")
+def get_feats_urls(url: str, fetcher: (Fetcher | None) = None) -> list[dict[str, str]]:
     """
     A function that takes a URL as input and returns a list of URLs for features.
 
     Args:
         url: a string representing the URL
+        fetcher: the fetcher used to request the page, defaults to `DEFAULT_FETCHER`
 
     Returns:
-        a list of BS4 elements representing the URLs for features
+        a list of rows like `get_wiki_table`, with the 'Feat Name' and 'URL' of every feature
     """
     list_feats = []
-    response = requests.get(url)
+    response = (fetcher or DEFAULT_FETCHER).get(url)
     if response.status_code != 200:
         return list_feats
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = parse_page(response.text)
     # this is just the title of the table, not the entire table
     list_links = soup.find(id="toc70").parent.parent.parent.find_all("a")
-    return list_links
+    for link in list_links:
+        list_feats.append({'Feat Name': link.text, 'URL': link.get("href")})
+    release_page(soup)
+    return list_feats
+
+
+def retry_failed(type_grab: str, fetcher: (Fetcher | None) = None, output_format: str = "json",
+                 sqlite: (SQLiteExport | None) = None, output_dir: (str | None) = None) -> tuple[int, int]:
+    """
+    Scrapes again only the rows of the dead-letter file of an export, without
+    fetching the index, and patches the records that succeed into the export,
+    at the position of their row in the index.
+
+    Args:
+        type_grab: The content type, a key of `CONTENT_TYPES`
+        fetcher: The fetcher used to request the pages
+        output_format: One of `export_writer.FORMATS`
+        sqlite: An export the retried records are written to as well
+        output_dir: The directory of the export, the current one by default
+
+    Returns:
+        tuple[int, int]: The number of rows retried and the number that still failed
+    """
+    fetcher = fetcher or Fetcher(rate=1 / INTERVAL)
+    _, export_file, class_parse = CONTENT_TYPES[type_grab]
+    path = export_path(export_file, output_format, output_dir)
+    dead_letters = DeadLetters(dead_letter_path(path))
+    entries = sorted(dead_letters.entries.values(),
+                     key=lambda entry: (entry["position"] is None, entry["position"] or 0))
+    failed_at = {entry["position"]: entry["url"] for entry in entries if entry["position"] is not None}
+
+    def scrape_entry(entry: dict) -> (str | None):
+        try:
+            return class_parse(entry["row"], fetcher=fetcher).to_json_str()
+        except Exception as e:
+            dead_letters.add(entry["row"], e)
+            return None
+
+    retried = {}
+    for entry, record in zip(entries, fetcher.map(scrape_entry, entries)):
+        if record is not None:
+            retried[entry["url"]] = record
+
+    succeeded = dict(retried)
+    if retried:
+        records = read_export(path) if os.path.exists(path) else []
+        # the export holds every row of the index but the failed ones, in order
+        patched = []
+        position = 0
+        for record in records:
+            while position in failed_at:
+                if failed_at[position] in retried:
+                    patched.append(retried.pop(failed_at[position]))
+                position += 1
+            patched.append(retried.pop(record["url"], None) or json.dumps(record, ensure_ascii=False))
+            position += 1
+        patched.extend(retried.values())
+
+        temporary_path = f'{path}.tmp'
+        writer = open_export(temporary_path, output_format)
+        try:
+            for record in patched:
+                writer.write(json.loads(record)["url"], record)
+            writer.finish()
+        finally:
+            writer.close()
+        replace_export(temporary_path, path)
+    for url, record in succeeded.items():
+        dead_letters.resolve(url)
+        if sqlite:
+            sqlite.write(class_parse.__name__, record)
+    dead_letters.finish()
+    if sqlite:
+        sqlite.flush()
+    return len(entries), len(dead_letters)
+
+
+def rederive_export(path: str) -> int:
+    """
+    Recomputes the fields of a spell export that come from the index rows, from
+    the index dump next to it, and rewrites the export in its format, without
+    fetching any page, e.g. after a fix to one of the `Spell._parse_*` methods.
+
+    Args:
+        path: The path of the export
+
+    Raises:
+        OSError: Raises an error if the export or the index dump can't be read
+
+    Returns:
+        int: The number of records in the export
+    """
+    with open(index_dump_path(path), encoding='utf-8') as dump_file:
+        rows = json.load(dump_file)
+    records = rederive_spell_fields(read_export(path), rows)
+    temporary_path = f'{path}.tmp'
+    writer = open_export(temporary_path, export_format(path))
+    try:
+        for record in records:
+            writer.write(record["url"], json.dumps(record, ensure_ascii=False))
+        writer.finish()
+    finally:
+        writer.close()
+    replace_export(temporary_path, path)
+    return len(records)
@@ -0,0 +1,224 @@
+from abc import ABC, abstractmethod
+import json
+import os
+
+FORMATS = ("json", "jsonl", "jsonl.gz", "jsonl.zst")
+
+
+def export_path(file_name: str, output_format: str = "json", directory: (str | None) = None) -> str:
+    """
+    Gets the path of an export in the given format, e.g. `exported_spells.jsonl`
+    for `exported_spells.json` in JSON Lines, in `directory` if there is one.
+    """
+    root, _ = os.path.splitext(file_name)
+    if directory:
+        root = os.path.join(directory, root)
+    return f'{root}.{output_format}'
+
+
+def export_format(path: str) -> str:
+    """
+    Gets the format of an export from its path, e.g. `jsonl.gz` for `exported_spells.jsonl.gz`.
+    """
+    return next((output_format for output_format in FORMATS if path.endswith(f'.{output_format}')), "json")
+
+
+def read_export(path: str) -> list[dict]:
+    """
+    Reads the records of an export in any format. A partially written last
+    line of a JSON Lines export is ignored.
+
+    Args:
+        path: The path of the export
+
+    Raises:
+        OSError: Raises an error if the export can't be read
+        json.JSONDecodeError: Raises an error if a JSON array export isn't complete
+
+    Returns:
+        list[dict]: The records of the export
+    """
+    if path.endswith((".gz", ".zst")):
+        from compressed_export import CompressedExport
+        with CompressedExport(path) as export:
+            return list(export)
+    with open(path, encoding='utf-8') as export_file:
+        if not path.endswith(".jsonl"):
+            return json.load(export_file)
+        records = []
+        for line in export_file:
+            if not line.endswith("\n"):
+                break
+            records.append(json.loads(line))
+        return records
+
+
+class ExportWriter(ABC):
+    """
+    Writes the records of an export one at a time, keeping track of the urls
+    written so far so an interrupted scrape can be resumed with `resume=True`.
+    """
+
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self.path = path
+        self.written: set[str] = set()
+        self.file = None
+        if resume and os.path.exists(path):
+            self._resume()
+        else:
+            self._start()
+
+    def _start(self) -> None:
+        self.file = open(self.path, "w", encoding='utf-8')
+
+    @abstractmethod
+    def _resume(self) -> None:
+        """
+        Opens an existing export to append the records that aren't in it yet, filling `written`.
+        """
+
+    @abstractmethod
+    def write(self, url: str, record: str) -> None:
+        """
+        Appends a record to the export.
+
+        Args:
+            url: The url of the record
+            record: The record as a JSON string
+        """
+
+    def finish(self) -> None:
+        """
+        Completes the export and closes the file.
+        """
+        self.close()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class JSONArrayWriter(ExportWriter):
+    """
+    Writes a JSON array. After each record the url and end offset of the record are
+    appended to `<path>.checkpoint`. Resuming cuts the export back to the last
+    checkpoint and carries on from there, the checkpoint is removed once the
+    array is complete.
+    """
+
+    def __init__(self, path: str, resume: bool = False) -> None:
+        self.checkpoint_path = path + ".checkpoint"
+        self.checkpoint = None
+        super().__init__(path, resume)
+
+    def _start(self) -> None:
+        super()._start()
+        self.checkpoint = open(self.checkpoint_path, "w", encoding='utf-8')
+        self.file.write("[\n")
+        self.file.flush()
+
+    def _resume(self) -> None:
+        if not os.path.exists(self.checkpoint_path):
+            # the previous run finished, open the array back up
+            try:
+                records = read_export(self.path)
+            except (OSError, json.JSONDecodeError):
+                records = []
+            self._start()
+            for record in records:
+                self.write(record.get('url', ''), json.dumps(record, ensure_ascii=False))
+            return
+
+        offset = None
+        with open(self.checkpoint_path, encoding='utf-8') as checkpoint:
+            for line in checkpoint:
+                if not line.endswith("\n"):
+                    break
+                entry = json.loads(line)
+                self.written.add(entry['url'])
+                offset = entry['offset']
+        if offset is None:
+            self._start()
+            return
+
+        self.file = open(self.path, "r+", encoding='utf-8')
+        self.file.seek(offset)
+        self.file.truncate()
+        self.checkpoint = open(self.checkpoint_path, "a", encoding='utf-8')
+
+    def write(self, url: str, record: str) -> None:
+        if self.written:
+            self.file.write(", ")
+        self.file.write(record + "\n")
+        self.file.flush()
+        self.written.add(url)
+        self.checkpoint.write(json.dumps(
+            {'url': url, 'offset': self.file.tell()}) + "\n")
+        self.checkpoint.flush()
+
+    def finish(self) -> None:
+        self.file.write("]")
+        self.close()
+        os.remove(self.checkpoint_path)
+
+    def close(self) -> None:
+        super().close()
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.checkpoint = None
+
+
+class JSONLinesWriter(ExportWriter):
+    """
+    Writes one record per line. Every line is flushed as soon as it is written, so
+    the export can be read while the scrape is running and is its own checkpoint.
+    """
+
+    def _resume(self) -> None:
+        self.file = open(self.path, "r+", encoding='utf-8')
+        offset = 0
+        for line in iter(self.file.readline, ""):
+            if not line.endswith("\n"):
+                break
+            self.written.add(json.loads(line).get('url', ''))
+            offset = self.file.tell()
+        # drop the line the previous run was writing when it stopped
+        self.file.seek(offset)
+        self.file.truncate()
+
+    def write(self, url: str, record: str) -> None:
+        self.file.write(record + "\n")
+        self.file.flush()
+        self.written.add(url)
+
+
+def open_export(path: str, output_format: str = "json", resume: bool = False) -> ExportWriter:
+    """
+    Opens a writer for an export.
+
+    Args:
+        path: The path of the export
+        output_format: 'json' for a JSON array, 'jsonl' for JSON Lines or
+            'jsonl.gz'/'jsonl.zst' for compressed JSON Lines with an offset index
+        resume: Keep the records already written by an interrupted scrape
+
+    Returns:
+        ExportWriter: The writer of the export
+    """
+    if output_format in ("jsonl.gz", "jsonl.zst"):
+        from compressed_export import CODECS, CompressedWriter
+        return CompressedWriter(path, CODECS[output_format], resume)
+    if output_format == "jsonl":
+        return JSONLinesWriter(path, resume)
+    return JSONArrayWriter(path, resume)
+
+
+def replace_export(source: str, path: str) -> None:
+    """
+    Moves a finished export over another one, along with its offset index if it has one.
+    """
+    from compressed_export import index_path
+    os.replace(source, path)
+    if os.path.exists(index_path(source)):
+        os.replace(index_path(source), index_path(path))
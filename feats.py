@@ -1,17 +1,22 @@
-from dataclasses import InitVar, dataclass
+from dataclasses import InitVar, dataclass, fields
 import json
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup, ResultSet
-import requests
+from fetcher import DEFAULT_FETCHER, Fetcher
+from metrics import profiled, timed
+from page_markdown import to_markdown
+from page_parser import parse_page, release_page, text_format
+import parse_cache
 from utils import BASE_URL, feets_to_units, sanitize_strings
 
 PREREQ_TEXT = "prerequisite"
+# bump when `_parse_html` changes what it gets from the page, it invalidates the parse cache
+PARSE_VERSION = 1
 
 
-@dataclass
+@dataclass(slots=True)
 class Feats:
-    feat: InitVar[ResultSet | None] = None
+    feat: InitVar[dict | None] = None
 
     name: str = ""
     description: str = ""
@@ -20,13 +25,27 @@ class Feats:
 
     has_prerequisite: bool = False
 
-    def __post_init__(self, feat: ResultSet = None):
+    fetcher: InitVar[Fetcher | None] = None
+    html: InitVar[str | None] = None
+
+    def __post_init__(self, feat: dict = None, fetcher: Fetcher = None, html: str = None):
         if feat is None:
             return
-        self.name = feat.text
-        self.url = urljoin(BASE_URL, feat.get("href"))
-        self.search_feats()
+        # {'Feat Name': '', 'URL': ''}
+        self.name = feat["Feat Name"]
+        self.url = urljoin(BASE_URL, feat["URL"])
+        self.search_feats(fetcher, html)
+
+    def to_json(self) -> dict:
+        """
+        Gets the fields of the feat.
+
+        Returns:
+            dict: The fields of the feat by name.
+        """
+        return {feat_field.name: getattr(self, feat_field.name) for feat_field in fields(self)}
 
+    @timed("serialize")
     def to_json_str(self) -> str:
         """
         Converts the object to a JSON string representation.
@@ -36,38 +55,68 @@ class Feats:
         Returns:
             str: A string representing the object in JSON format.
         """
-        return json.dumps(self.__dict__, default=lambda o: o.toJSON(), ensure_ascii=False)
+        return json.dumps(self.to_json(), default=lambda o: o.toJSON(), ensure_ascii=False)
 
-    def search_feats(self) -> None:
+    def search_feats(self, fetcher: Fetcher = None, html: str = None) -> None:
         """
         Perform a search for features based on the provided URL and name.
 
         Parameters:
             self: The object being searched.
+            fetcher (Fetcher): The fetcher used to request the page, defaults to `DEFAULT_FETCHER`.
+            html (str): The already downloaded page, if given the page is parsed without any request.
 
-        Returns:
-            Returns an instance of Feats if features are found, otherwise returns None.
+        Raises:
+            LookupError: Raises an error if the page can't be downloaded.
         """
-        response = requests.get(self.url)
-        if response.status_code != 200:
-            return None
-        soup = BeautifulSoup(response.text, 'html.parser')
-        paragraphs = soup.find(id="page-content")
-        link_paragraphs = paragraphs.find_all('a')
-        for link in link_paragraphs:
-            link.replace_with(link.text)
-
-        paragraphs = list(filter(lambda x: x.text.strip()
-                                 != "", paragraphs.children))[1:]
-        prereq = ""
-        has_prereq = False
-        if PREREQ_TEXT.lower() in paragraphs[0].text.lower():
-            split_at = paragraphs[0].text.find(" ")
-            prereq = paragraphs[0].text[split_at+1:]
-            has_prereq = True
-            paragraphs = paragraphs[1:]
-
-        paragraphs = sanitize_strings("".join(map(str, paragraphs)))
-        self.description, self.prerequisite, self.has_prerequisite = (
-            paragraphs, prereq, has_prereq)
-        self.description = feets_to_units(self.description)
+        if html is None:
+            response = (fetcher or DEFAULT_FETCHER).get(self.url)
+            if response.status_code != 200:
+                raise LookupError(f'Could not find {self.name} using this URL: {self.url}')
+            html = response.text
+        key, cached = parse_cache.lookup("Feats", PARSE_VERSION, html)
+        if cached is not None:
+            self.description, self.prerequisite, self.has_prerequisite = (
+                cached["description"], cached["prerequisite"], cached["has_prerequisite"])
+            return
+        self._parse_html(html)
+        parse_cache.store("Feats", PARSE_VERSION, key, {
+            "description": self.description,
+            "prerequisite": self.prerequisite,
+            "has_prerequisite": self.has_prerequisite,
+        })
+
+    @profiled
+    @timed("parse")
+    def _parse_html(self, html: str) -> None:
+        """
+        Parse the page of the feat and set the description and prerequisite found on it.
+
+        Parameters:
+            html (str): The page of the feat.
+        """
+        page = parse_page(html)
+        try:
+            link_paragraphs = page.find_all('a')
+            for link in link_paragraphs:
+                link.replace_with(link.text)
+
+            paragraphs = list(filter(lambda x: x.text.strip()
+                                     != "", page.children))[1:]
+            prereq = ""
+            has_prereq = False
+            if PREREQ_TEXT.lower() in paragraphs[0].text.lower():
+                split_at = paragraphs[0].text.find(" ")
+                prereq = paragraphs[0].text[split_at+1:]
+                has_prereq = True
+                paragraphs = paragraphs[1:]
+
+            if text_format() == "markdown":
+                paragraphs = sanitize_strings(to_markdown(paragraphs), keep_newlines=True).strip()
+            else:
+                paragraphs = sanitize_strings("".join(map(str, paragraphs)))
+            self.description, self.prerequisite, self.has_prerequisite = (
+                paragraphs, prereq, has_prereq)
+            self.description = feets_to_units(self.description)
+        finally:
+            release_page(page)
@@ -0,0 +1,417 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
+from typing import Callable, Iterable, Iterator, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from defaults import DEFAULT_MAX_RATE, DEFAULT_RETRIES, DEFAULT_TIMEOUT, DEFAULT_WORKERS
+from http_cache import CachedPage, HTTPCache
+from metrics import METRICS, timed
+from page_archive import ArchiveReader, PageArchive
+
+# seconds, doubled on every retry
+DEFAULT_BACKOFF = 1
+MAX_BACKOFF = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# responses telling the adaptive controller that the server is overloaded
+THROTTLE_STATUSES = {429, 502, 503, 504}
+# requests per second the adaptive controller starts at without a rate
+DEFAULT_START_RATE = 1
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """
+    A thread safe token bucket. Every `acquire` takes one token and blocks until
+    the bucket has refilled enough to pay for it.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes a token from the bucket, sleeping until it is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is reserved even if the bucket is empty, so callers
+            # waiting at the same time queue up one interval apart
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Keeps one `TokenBucket` per host so every site is limited on its own.
+    """
+
+    def __init__(self, rate: (float | None) = None) -> None:
+        self.rate = rate
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        """
+        Blocks until a request to the host of `url` is allowed.
+
+        Args:
+            url: The url about to be requested
+        """
+        if not self.rate:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate)
+        bucket.acquire()
+
+
+def retry_after(response: requests.Response) -> float:
+    """
+    Reads the `Retry-After` header of a response, given in seconds or as a date.
+
+    Returns:
+        float: The number of seconds to wait, 0 without a valid header
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return 0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0
+
+
+class AIMDController:
+    """
+    Adapts the number of requests in flight and the request rate to what the
+    server tolerates, like TCP congestion control. Until the server first shows
+    congestion both double about every round trip (slow start), after that every
+    healthy response adds a little to both (about one more request in flight per
+    round trip and `rate_increase` more requests per second every second). A
+    throttled response, a dropped connection or a latency spike multiplies both
+    by `decrease`, and a `Retry-After` pauses every request until it has passed.
+    """
+
+    # a response this many times slower than the usual latency is a spike
+    LATENCY_SPIKE = 3
+    # weight of every response in the usual latency
+    LATENCY_SMOOTHING = 0.1
+
+    def __init__(self, max_concurrency: int, rate: float = DEFAULT_START_RATE,
+                 max_rate: float = DEFAULT_MAX_RATE, min_rate: float = 0.1,
+                 rate_increase: float = 0.5, decrease: float = 0.5) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_rate = max(rate, max_rate)
+        self.min_rate = min(rate, min_rate)
+        self.rate_increase = rate_increase
+        self.decrease = decrease
+        self.concurrency = 1.0
+        self.bucket = TokenBucket(rate)
+        self.latency = None
+        self.slow_start = True
+        self._active = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request may be sent: a slot is free, no `Retry-After` is
+        pending and the rate allows it.
+        """
+        with self._condition:
+            while True:
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self._active < int(self.concurrency):
+                    break
+                self._condition.wait(pause if pause > 0 else None)
+            self._active += 1
+        self.bucket.acquire()
+
+    def release(self, latency: float, response: (requests.Response | None)) -> None:
+        """
+        Frees the slot of a request and adapts to how it went.
+
+        Args:
+            latency: Seconds the request took
+            response: The response, None if the connection failed
+        """
+        with self._condition:
+            self._active -= 1
+            now = time.monotonic()
+            if response is None or response.status_code in THROTTLE_STATUSES:
+                if response is not None:
+                    self._paused_until = max(self._paused_until, now + retry_after(response))
+                self._decrease(now)
+            else:
+                spike = self.latency is not None and latency > self.LATENCY_SPIKE * self.latency
+                # spikes count towards the usual latency too, so a server that stays
+                # slower is learned instead of every later response being a spike
+                if response.status_code < 500:
+                    self.latency = latency if self.latency is None else (
+                        (1 - self.LATENCY_SMOOTHING) * self.latency + self.LATENCY_SMOOTHING * latency)
+                if spike:
+                    self._decrease(now)
+                elif response.status_code < 500:
+                    if self.slow_start:
+                        self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                        self.bucket.rate = min(self.max_rate, self.rate + 1)
+                    else:
+                        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                        self.bucket.rate = min(self.max_rate,
+                                               self.rate + self.rate_increase / max(self.rate, 1))
+            self._condition.notify_all()
+
+    def _decrease(self, now: float) -> None:
+        # requests sent before the last decrease report the same congestion, so
+        # decrease at most once per round trip
+        if now - self._last_decrease < max(self.latency or 0, 1 / self.rate):
+            return
+        self._last_decrease = now
+        self.slow_start = False
+        METRICS.incr("fetch.throttled")
+        self.concurrency = max(1.0, self.concurrency * self.decrease)
+        self.bucket.rate = max(self.min_rate, self.rate * self.decrease)
+
+
+class Fetcher:
+    """
+    Fetches pages for the scrapers. Requests are spread over a pool of `workers`
+    threads and limited to `rate` requests per second for each host. Scrapers
+    sharing a fetcher share both budgets: no more than `workers` requests are
+    in flight at once, whichever scraper they come from.
+
+    All requests go through one `requests.Session`, so connections are kept
+    alive and reused, and 429 and 5xx responses are retried with a jittered
+    exponential backoff, or after their `Retry-After` when that is longer.
+
+    With a `cache`, pages seen before are requested with `If-None-Match` /
+    `If-Modified-Since` and the cached body is reused on a 304. `refresh`
+    skips the revalidation and downloads every page again.
+
+    With `adaptive`, `workers` and `max_rate` are only upper bounds: an
+    `AIMDController` starting at `rate` finds how many requests the server
+    takes at once and per second from its latency and throttling.
+
+    With an `archive`, every page fetched is also appended to it, so the
+    exports can be parsed again later without the site with `ArchiveFetcher`.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, rate: (float | None) = None,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, cache: (HTTPCache | None) = None,
+                 refresh: bool = False, adaptive: bool = False,
+                 max_rate: float = DEFAULT_MAX_RATE, archive: (PageArchive | None) = None) -> None:
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.archive = archive
+        self.refresh = refresh
+        self.limiter = HostRateLimiter(rate)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._in_flight = threading.BoundedSemaphore(self.workers)
+        self.controller = AIMDController(self.workers, rate or DEFAULT_START_RATE,
+                                         max_rate) if adaptive else None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @timed("fetch")
+    def get(self, url: str) -> requests.Response:
+        """
+        Requests the given url, revalidating the cached copy if there is one.
+
+        Args:
+            url: The url to request
+
+        Returns:
+            requests.Response: The response of the page, with the cached body if
+                the server answered 304 Not Modified
+        """
+        cached = None
+        if self.cache is not None and not self.refresh:
+            cached = self.cache.get(url)
+        response = self._request(url, cached.validators() if cached else None)
+
+        METRICS.incr("fetch.bytes", len(response.content))
+        if response.status_code == 304 and cached is not None:
+            METRICS.incr("fetch.not_modified")
+            response.status_code = 200
+            response._content = cached.body
+            response.encoding = cached.encoding
+        elif response.status_code == 200 and self.cache is not None:
+            self.cache.put(CachedPage(url, response.content, response.encoding,
+                                      response.headers.get("ETag"),
+                                      response.headers.get("Last-Modified")))
+        if response.status_code == 200 and self.archive is not None:
+            self.archive.add(url, response.content, response.encoding)
+        return response
+
+    def _request(self, url: str, headers: (dict[str, str] | None) = None) -> requests.Response:
+        """
+        Requests the given url once the rate limit allows it, retrying on
+        throttling, server errors and dropped connections.
+
+        Args:
+            url: The url to request
+            headers: Extra headers to send
+
+        Raises:
+            requests.RequestException: Raises the last connection error once the retries run out
+
+        Returns:
+            requests.Response: The response of the page, which is the last failed
+                response if the retries run out
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                METRICS.incr("fetch.retries")
+            delay = self._backoff_delay(attempt)
+            METRICS.incr("fetch.requests")
+            try:
+                if self.controller is not None:
+                    response = self._adaptive_request(url, headers)
+                else:
+                    self.limiter.acquire(url)
+                    with self._in_flight:
+                        response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICS.incr("fetch.connection_errors")
+                if attempt == self.retries:
+                    raise
+            else:
+                METRICS.incr(f"fetch.status.{response.status_code}")
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                delay = max(delay, min(MAX_BACKOFF, retry_after(response)))
+            time.sleep(delay)
+
+    def _adaptive_request(self, url: str, headers: (dict[str, str] | None) = None) -> requests.Response:
+        """
+        Sends one request once the adaptive controller allows it, and reports how it went.
+        """
+        self.controller.acquire()
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            return response
+        finally:
+            self.controller.release(time.monotonic() - start, response)
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """
+        Picks a random delay up to `backoff * 2 ** attempt` seconds, so workers
+        that failed together don't retry together.
+
+        Args:
+            attempt: The number of the attempt that failed, starting at 0
+
+        Returns:
+            float: The number of seconds to wait
+        """
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections, the cache and the archive.
+        """
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.archive is not None:
+            self.archive.close()
+
+    def map(self, func: Callable[[T], R], items: Iterable[T],
+            max_in_flight: (int | None) = None) -> Iterator[R]:
+        """
+        Runs `func` over `items` on the worker pool. Items are only submitted
+        while fewer than `max_in_flight` results are waiting to be consumed, so
+        a slow consumer doesn't pile up results.
+
+        Args:
+            func: The function to run, usually the constructor of a scraped class
+            items: The items to run the function on
+            max_in_flight: Most items running or done but not consumed yet, defaults to twice the workers
+
+        Returns:
+            Iterator: The results in the same order as `items`
+        """
+        if self.workers == 1:
+            yield from map(func, items)
+            return
+        limit = max(1, max_in_flight or 2 * self.workers)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for item in items:
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+
+
+class ArchiveFetcher(Fetcher):
+    """
+    Serves the pages of an archive instead of requesting them, without any
+    network access or rate limit. Pages missing from the archive are answered
+    with a 404, so they fail like pages missing from the site.
+    """
+
+    def __init__(self, reader: ArchiveReader, workers: int = DEFAULT_WORKERS) -> None:
+        super().__init__(workers)
+        self.reader = reader
+
+    @timed("fetch")
+    def get(self, url: str) -> requests.Response:
+        response = requests.Response()
+        response.url = url
+        page = self.reader.get(url)
+        if page is None:
+            METRICS.incr("fetch.not_archived")
+            response.status_code = 404
+            response._content = b""
+            return response
+        METRICS.incr("fetch.bytes", len(page.body))
+        response.status_code = 200
+        response._content = page.body
+        response.encoding = page.encoding
+        return response
+
+    def close(self) -> None:
+        super().close()
+        self.reader.close()
+
+
+DEFAULT_FETCHER = Fetcher()
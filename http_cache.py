@@ -0,0 +1,69 @@
+from dataclasses import dataclass
+
+from defaults import DEFAULT_CACHE_SIZE
+from sqlite_lru import SQLiteLRU
+
+
+@dataclass
+class CachedPage:
+    url: str
+    body: bytes
+    encoding: (str | None) = None
+    etag: (str | None) = None
+    last_modified: (str | None) = None
+
+    def validators(self) -> dict[str, str]:
+        """
+        Builds the headers for a conditional request of this page.
+
+        Returns:
+            dict[str, str]: The `If-None-Match` and `If-Modified-Since` headers
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    """
+    An on disk cache of pages keyed by url, stored in a single SQLite file.
+
+    Only pages with an `ETag` or `Last-Modified` header are kept since the cache
+    is revalidated on every request. Once the bodies grow past `max_size` bytes
+    the least recently used pages are evicted.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+        self._pages = SQLiteLRU(path, "pages", "url", ("body BLOB NOT NULL", "encoding TEXT", "etag TEXT",
+                                                       "last_modified TEXT"), max_size)
+
+    def get(self, url: str) -> (CachedPage | None):
+        """
+        Looks up a page and marks it as recently used.
+
+        Args:
+            url: The url of the page
+
+        Returns:
+            CachedPage | None: The cached page, or None if it isn't cached
+        """
+        row = self._pages.get(url, "body, encoding, etag, last_modified")
+        return CachedPage(url, *row) if row is not None else None
+
+    def put(self, page: CachedPage) -> None:
+        """
+        Stores a page, evicting the least recently used pages if the cache is full.
+
+        Args:
+            page: The page to store
+        """
+        if page.etag or page.last_modified:
+            self._pages.put(page.url, (page.body, page.encoding, page.etag, page.last_modified), len(page.body))
+
+    def close(self) -> None:
+        self._pages.close()
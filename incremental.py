@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from urllib.parse import urljoin
+
+from export_writer import read_export
+from utils import BASE_URL
+
+
+def row_url(row: dict[str, str]) -> str:
+    """
+    Gets the absolute url of the detail page of an index row.
+
+    Args:
+        row: A row from `get_wiki_table` or `get_feats_urls`
+
+    Returns:
+        str: The url, as stored in the exported records
+    """
+    return urljoin(BASE_URL, row['URL'])
+
+
+def row_fingerprint(row: dict[str, str]) -> str:
+    """
+    Hashes every column of an index row, so any change to the row changes the fingerprint.
+
+    Args:
+        row: A row from `get_wiki_table` or `get_feats_urls`
+
+    Returns:
+        str: The hex digest of the row
+    """
+    encoded = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def fingerprints_path(export_path: str) -> str:
+    """
+    Gets the path of the file holding the fingerprints of an export,
+    e.g. `exported_spells.fingerprints.json` for `exported_spells.json`.
+    """
+    root, _ = os.path.splitext(export_path)
+    return root + '.fingerprints.json'
+
+
+def load_previous_export(export_path: str) -> dict[str, tuple[str, str]]:
+    """
+    Loads the records of a previous export along with the fingerprints of the
+    index rows they were scraped from.
+
+    Args:
+        export_path: The path of the previous export
+
+    Returns:
+        dict[str, tuple[str, str]]: The fingerprint and JSON string of each record,
+            keyed by url. Empty if there is no complete previous export.
+    """
+    try:
+        records = read_export(export_path)
+        with open(fingerprints_path(export_path), encoding='utf-8') as fingerprints_file:
+            fingerprints = json.load(fingerprints_file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+    previous = {}
+    for record in records:
+        fingerprint = fingerprints.get(record.get('url'))
+        if fingerprint is not None:
+            previous[record['url']] = (
+                fingerprint, json.dumps(record, ensure_ascii=False))
+    return previous
+
+
+def save_fingerprints(export_path: str, fingerprints: dict[str, str]) -> None:
+    """
+    Saves the fingerprints of the rows used for an export, keyed by url.
+    """
+    with open(fingerprints_path(export_path), 'w', encoding='utf-8') as fingerprints_file:
+        json.dump(fingerprints, fingerprints_file, sort_keys=True)
@@ -0,0 +1,340 @@
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from compressed_export import index_path
+from dead_letter import DeadLetters, dead_letter_path
+from export_writer import export_path, read_export
+from incremental import fingerprints_path
+from query import FEAT_FIELDS, MAGIC_ITEM_FIELDS, SPELL_FIELDS, QueryIndex, parse_condition, rows
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# content type -> (export file as written by DNDScraper, fields with a bitmap index)
+COLLECTIONS = {
+    "feats": ("exported_feats.json", FEAT_FIELDS),
+    "magic_item": ("exported_magic_items.json", MAGIC_ITEM_FIELDS),
+    "spells": ("exported_spells.json", SPELL_FIELDS),
+}
+
+
+def name_key(name: str) -> str:
+    return name.strip().casefold()
+
+
+def url_key(url: str) -> str:
+    """
+    Gets the path of a url, so records are found by their full url or by its path alone, e.g. `/spell:fireball`.
+    """
+    return unquote(urlsplit(url).path)
+
+
+@dataclass(frozen=True)
+class Collection:
+    """
+    The records of one export, indexed for lookups. Every record is kept
+    serialized as well, so a lookup is answered without encoding anything.
+    """
+    records: list[dict]
+    encoded: list[bytes]
+    by_name: dict[str, int]
+    by_url: dict[str, int]
+    index: QueryIndex
+
+    @classmethod
+    def build(cls, records: list[dict], fields: tuple[str, ...]) -> "Collection":
+        by_name = {}
+        by_url = {}
+        for i, record in enumerate(records):
+            by_name.setdefault(name_key(record["name"]), i)
+            by_url.setdefault(url_key(record["url"]), i)
+        encoded = [json.dumps(record, ensure_ascii=False).encode("utf-8") for record in records]
+        return cls(records, encoded, by_name, by_url, QueryIndex(records, fields))
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Every collection served at one point in time. A snapshot is never changed
+    once built, a refresh builds a new one and swaps it in.
+    """
+    collections: dict[str, Collection]
+    loaded_at: str
+
+
+class LookupService:
+    """
+    Keeps the exports of the served content types in memory and scrapes them
+    again in the background.
+
+    The scraper runs in its own process with the scrape options `main.py` was
+    given, so its parsing doesn't hold the GIL of the threads answering lookups.
+    It writes to a temporary directory next to the exports, which replace the
+    served ones only once it exits successfully, so a scraper that dies midway
+    never leaves a truncated export behind. The exports are then loaded into a
+    new snapshot and swapped in with a single assignment. A request reads
+    `self.snapshot` once and answers from it, never from a mix of two
+    snapshots, and a failed scrape or load keeps the last snapshot.
+    """
+
+    def __init__(self, type_grabs: list[str], output_format: str = "json",
+                 scrape_argv: (list[str] | None) = None, interval: float = 0,
+                 output_dir: (str | None) = None) -> None:
+        self.type_grabs = type_grabs
+        self.output_format = output_format
+        self.scrape_argv = scrape_argv
+        self.interval = interval
+        self.output_dir = output_dir
+        self.errors: dict[str, str] = {}
+        self.refreshed_at: (str | None) = None
+        self._refreshing = threading.Lock()
+        self._stop = threading.Event()
+        self.snapshot = Snapshot({}, "")
+        self.reload()
+
+    def export_path(self, type_grab: str) -> str:
+        return export_path(COLLECTIONS[type_grab][0], self.output_format, self.output_dir)
+
+    def reload(self) -> None:
+        """
+        Loads the exports into a new snapshot and swaps it in. An export that
+        can't be read keeps its collection of the last snapshot, or none.
+        """
+        collections = {}
+        for type_grab in self.type_grabs:
+            path = self.export_path(type_grab)
+            try:
+                records = read_export(path)
+            except (OSError, ValueError) as e:
+                self.errors[type_grab] = f"{path}: {e}"
+                if type_grab in self.snapshot.collections:
+                    collections[type_grab] = self.snapshot.collections[type_grab]
+                continue
+            collections[type_grab] = Collection.build(records, COLLECTIONS[type_grab][1])
+            self.errors.pop(type_grab, None)
+        self.snapshot = Snapshot(collections, datetime.now(timezone.utc).isoformat(timespec="seconds"))
+
+    @property
+    def refreshing(self) -> bool:
+        return self._refreshing.locked()
+
+    def refresh(self) -> bool:
+        """
+        Scrapes the served content types again and reloads them, unless a refresh is already running.
+
+        Returns:
+            bool: Whether the scrape ran and succeeded
+        """
+        if self.scrape_argv is None or not self._refreshing.acquire(blocking=False):
+            return False
+        directory = None
+        try:
+            # in the directory of the exports, so they are moved and not copied into place
+            directory = tempfile.mkdtemp(prefix=".refresh-", dir=self.output_dir or ".")
+            copied = self._copy_exports(directory)
+            result = subprocess.run([sys.executable, MAIN] + self.scrape_argv + ["--output-dir", directory])
+            if result.returncode != 0:
+                self.errors["refresh"] = f"the scraper exited with {result.returncode}"
+                return False
+            # the export of a full scrape leaves out the rows that failed, swapping it in would stop serving them
+            failed = self._failed_rows(directory)
+            if failed:
+                self.errors["refresh"] = "rows failed, the exports are kept: " + ", ".join(
+                    f"{count} in {name}" for name, count in failed.items())
+                return False
+            self._replace_exports(directory, copied)
+            self.errors.pop("refresh", None)
+            self.reload()
+            self.refreshed_at = self.snapshot.loaded_at
+            return True
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+            self._refreshing.release()
+
+    def _copy_exports(self, directory: str) -> set[str]:
+        """
+        Copies the served exports into `directory`, with the files next to them
+        that `--incremental` and `--retry-failed` carry on from.
+
+        Returns:
+            set[str]: The names of the copied files
+        """
+        copied = set()
+        for type_grab in self.type_grabs:
+            path = self.export_path(type_grab)
+            for source in (path, index_path(path), fingerprints_path(path), dead_letter_path(path)):
+                if os.path.exists(source):
+                    shutil.copy2(source, directory)
+                    copied.add(os.path.basename(source))
+        return copied
+
+    def _failed_rows(self, directory: str) -> dict[str, int]:
+        """
+        Counts the rows the scrape in `directory` couldn't scrape.
+
+        Returns:
+            dict[str, int]: The number of failed rows by dead-letter file, without the files that have none
+        """
+        failed = {}
+        for type_grab in self.type_grabs:
+            path = dead_letter_path(export_path(COLLECTIONS[type_grab][0], self.output_format, directory))
+            count = len(DeadLetters(path))
+            if count:
+                failed[os.path.basename(path)] = count
+        return failed
+
+    def _replace_exports(self, directory: str, copied: set[str]) -> None:
+        """
+        Moves everything the scraper wrote in `directory` over the served files,
+        and deletes the copied files the scraper removed, e.g. the failed rows
+        once they all succeeded.
+        """
+        written = set(os.listdir(directory))
+        for name in written:
+            target = os.path.join(self.output_dir or ".", name)
+            if os.path.isdir(target):
+                # e.g. the columns of `--columnar`, a directory can't be replaced in one move
+                shutil.rmtree(target)
+            os.replace(os.path.join(directory, name), target)
+        for name in copied - written:
+            os.remove(os.path.join(self.output_dir or ".", name))
+
+    def start(self) -> "LookupService":
+        """
+        Refreshes every `interval` seconds on a background thread, if there is an interval.
+        """
+        def refresh_forever():
+            while not self._stop.wait(self.interval):
+                self.refresh()
+
+        if self.interval > 0 and self.scrape_argv is not None:
+            threading.Thread(target=refresh_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "loaded_at": snapshot.loaded_at,
+            "refreshed_at": self.refreshed_at,
+            "refreshing": self.refreshing,
+            "records": {type_grab: len(collection.records) for type_grab, collection in snapshot.collections.items()},
+            "errors": dict(self.errors),
+        }
+
+
+class LookupServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: LookupService, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), LookupHandler)
+        self.service = service
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """
+    GET /status
+        The time the snapshot was loaded, the records of every content type and the last errors.
+    GET /<type>?name=NAME or /<type>?url=URL
+        The record with the name (any case) or url, the url can be only its path.
+    GET /<type>?FIELD=VALUE[,VALUE...]&without=FIELD=VALUE&fields=name,url&count=true
+        The records matching the conditions, in the order of the export, with the
+        same conditions as the `query` command.
+    POST /refresh
+        Scrapes again in the background.
+    """
+    server: LookupServer
+    # keep-alive, local clients don't pay for a connection per lookup
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are written separately, without this the body waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        type_grab = url.path.strip("/")
+        if type_grab == "status":
+            self._send_json(200, self.server.service.status())
+            return
+        # the snapshot is read once, the whole request is answered from it
+        collection = self.server.service.snapshot.collections.get(type_grab)
+        if collection is None:
+            self._send_json(404, {"error": f"unknown content type: {type_grab}"})
+            return
+
+        parameters = parse_qsl(url.query, keep_blank_values=True)
+        lookups = dict(parameters)
+        if "name" in lookups or "url" in lookups:
+            i = (collection.by_name.get(name_key(lookups["name"])) if "name" in lookups
+                 else collection.by_url.get(url_key(lookups["url"])))
+            if i is None:
+                self._send_json(404, {"error": "not found"})
+            else:
+                self._send(200, collection.encoded[i])
+            return
+
+        try:
+            bitmap = collection.index.all
+            for name, value in parameters:
+                if name in ("fields", "count"):
+                    continue
+                if name == "without":
+                    name, values = parse_condition(value)
+                    bitmap &= ~collection.index.match(name, values)
+                else:
+                    name, values = parse_condition(f"{name}={value}")
+                    bitmap &= collection.index.match(name, values)
+        except argparse.ArgumentTypeError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except KeyError as e:
+            self._send_json(400, {"error": f"{e} is not indexed, the indexed fields are: "
+                                           f"{', '.join(collection.index.bitmaps)}"})
+            return
+
+        if lookups.get("count") == "true":
+            self._send_json(200, {"count": bitmap.bit_count()})
+        elif "fields" in lookups:
+            fields = lookups["fields"].split(",")
+            self._send_json(200, [{name: collection.records[i].get(name) for name in fields}
+                                  for i in rows(bitmap)])
+        else:
+            self._send(200, b"[" + b",".join(collection.encoded[i] for i in rows(bitmap)) + b"]")
+
+    def do_POST(self):
+        # the body isn't used, but has to be read for the next request on the connection
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if urlsplit(self.path).path != "/refresh":
+            self._send_json(404, {"error": "not found"})
+            return
+        service = self.server.service
+        if service.scrape_argv is None:
+            self._send_json(409, {"error": "the server was started without a scrape to refresh with"})
+            return
+        if not service.refreshing:
+            threading.Thread(target=service.refresh, daemon=True).start()
+        self._send_json(202, {"refreshing": True})
+
+    def _send_json(self, status: int, body: object) -> None:
+        self._send(status, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
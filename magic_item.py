@@ -2,12 +2,17 @@
 from enum import Enum
 import json
 from urllib.parse import urljoin
-import requests
-from bs4 import BeautifulSoup
-from markdownify import markdownify
 
+from fetcher import DEFAULT_FETCHER, Fetcher
+from metrics import METRICS, profiled, timed
+from page_markdown import to_markdown
+from page_parser import parse_page, release_page
+import parse_cache
 from utils import BASE_URL
 
+# bump when `_parse_html` changes what it gets from the page, it invalidates the parse cache
+PARSE_VERSION = 1
+
 
 class Type(Enum):
     Weapon = 0
@@ -93,8 +98,10 @@ class Rarity(Enum):
 
 
 class MagicItem:
+    __slots__ = ("name", "rarity", "type", "attuned", "url", "source", "text")
 
-    def __init__(self, item: dict[str, str]) -> None:
+    def __init__(self, item: dict[str, str], fetcher: (Fetcher | None) = None,
+                 html: (str | None) = None) -> None:
         self.name = item['Item Name']
         self.rarity = Rarity[item['category'].replace(
             ' ', '').replace('???', 'Unknown')]
@@ -108,25 +115,58 @@ class MagicItem:
                   self.name} using the following URL: {self.url}')
             print(e)
             self.source = Source.U
-        self.text = item.get('text', self.set_item_text())
+        self.text = item['text'] if 'text' in item else self.set_item_text(fetcher, html)
 
-    def set_item_text(self) -> str:
+    def set_item_text(self, fetcher: (Fetcher | None) = None, html: (str | None) = None) -> str:
         """
         Sets the item text based on the url
 
+        Args:
+            fetcher: The fetcher used to request the page, defaults to `DEFAULT_FETCHER`
+            html: The already downloaded page, if given the page is parsed without any request
+
         Raises:
             LookupError: Raises an error if the url is not found
 
         Returns:
             str: The item text
         """
-        item_page = requests.get(self.url)
-        if item_page.status_code != 200:
-            raise LookupError(f'Could not find {
-                              self.name} using this URL: {self.url}')
-        element_html = str(BeautifulSoup(item_page.content,
-                           'html.parser').find(id='page-content'))
-        return markdownify(element_html, strip=['scripts', 'page-tags'], autolinks=False)
+        if html is None:
+            item_page = (fetcher or DEFAULT_FETCHER).get(self.url)
+            if item_page.status_code != 200:
+                raise LookupError(f'Could not find {
+                                  self.name} using this URL: {self.url}')
+            html = item_page.content
+        key, cached = parse_cache.lookup("MagicItem", PARSE_VERSION, html)
+        if cached is not None:
+            return cached["text"]
+        text = self._parse_html(html)
+        parse_cache.store("MagicItem", PARSE_VERSION, key, {"text": text})
+        return text
+
+    @profiled
+    @timed("parse")
+    def _parse_html(self, html: (str | bytes)) -> str:
+        """
+        Converts the content of the item page to markdown.
+
+        Args:
+            html: The page of the item
+
+        Raises:
+            LookupError: Raises an error if the page has no content
+
+        Returns:
+            str: The item text
+        """
+        page = parse_page(html)
+        if page is None:
+            raise LookupError(f'No content found on the page of {self.name}')
+        try:
+            with METRICS.timer("markdownify"):
+                return to_markdown(page)
+        finally:
+            release_page(page)
 
     def to_json(self) -> dict[str, str]:
         """
@@ -145,6 +185,7 @@ class MagicItem:
             "url"       : self.url
         }
     
+    @timed("serialize")
     def to_json_str(self) -> str:
         """
         Converts the object to a JSON string representation.
@@ -1,31 +1,371 @@
+from __future__ import annotations
+
 import argparse
-from dnd_scraper import DNDScraper
+import json
+import os
+import sys
+from typing import TYPE_CHECKING
 
+from defaults import (BACKENDS, DEFAULT_BACKEND, DEFAULT_BATCH_SIZE, DEFAULT_CACHE_SIZE, DEFAULT_LEASE,
+                      DEFAULT_MAX_RATE, DEFAULT_PARSE_CACHE_SIZE, DEFAULT_PORT, DEFAULT_RESCRAPE_INTERVAL,
+                      DEFAULT_RETRIES, DEFAULT_TIMEOUT, DEFAULT_WORKERS, INTERVAL, TEXT_FORMATS)
+from export_writer import FORMATS, read_export
+from query import parse_condition
 
-parser = argparse.ArgumentParser(
-                    prog='DnD Scraper',
-                    description='Scrapes DnD content')
+# the modules scraping pages are imported by the commands using them, they take longer to import
+# than most commands reading an export take to run
+if TYPE_CHECKING:
+    from dnd_scraper import DNDScraper
+    from fetcher import Fetcher
+    from sqlite_export import SQLiteExport
 
-parser.add_argument('-f', '--feats', help='Scrape feats', action='store_true')
-parser.add_argument('-m', '--magic_item', help='Scrape magic items', action='store_true')
-parser.add_argument('-s', '--spells', help='Scrape spells', action='store_true')
-args = parser.parse_args()
 
-if __name__ == "__main__":
-    if not any(vars(args).values()):
+def parse_rate(rate: str) -> float:
+    """
+    Parses a rate given as `R` or `R/s` into requests per second.
+
+    Args:
+        rate: The rate given on the command line
+
+    Returns:
+        float: The number of requests per second
+    """
+    try:
+        return float(rate.removesuffix("/s"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate: {rate}")
+
+
+# flag of the content type, also the type given to DNDScraper -> name printed while scraping it
+CONTENT_TYPES = {"feats": "feats", "magic_item": "magic items", "spells": "spells"}
+
+
+class CommandsAction(argparse._SubParsersAction):
+    """
+    Keeps the command and its arguments as `command_argv`. Argparse gives a command
+    every argument from its name on, so the ones before are the options of the main parser.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        namespace.command_argv = list(values)
+        super().__call__(parser, namespace, values, option_string)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the parser of the command line, from constants only, so nothing heavy is imported for `--help`.
+    """
+    parser = argparse.ArgumentParser(
+                        prog='DnD Scraper',
+                        description='Scrapes DnD content')
+
+    parser.add_argument('-f', '--feats', help='Scrape feats', action='store_true')
+    parser.add_argument('-m', '--magic_item', help='Scrape magic items', action='store_true')
+    parser.add_argument('-s', '--spells', help='Scrape spells', action='store_true')
+    parser.add_argument('--workers', help='Number of pages fetched at the same time',
+                        type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', help='Requests per second for each host, e.g. 2/s (0 for no limit)',
+                        type=parse_rate, default=1 / INTERVAL)
+    parser.add_argument('--adaptive', help='Adapt the requests in flight and the rate to the latency and throttling of the server, '
+                        'starting from --rate and up to --workers and --max-rate', action='store_true')
+    parser.add_argument('--max-rate', help='Most requests per second with --adaptive, e.g. 10/s',
+                        type=parse_rate, default=DEFAULT_MAX_RATE)
+    parser.add_argument('--timeout', help='Seconds to wait for a page before giving up',
+                        type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--retries', help='Number of retries for throttled, failed or dropped requests',
+                        type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--cache', help='File to cache pages in, pages are revalidated with the server on later runs')
+    parser.add_argument('--cache-size', help='Maximum size of the cache in MB',
+                        type=float, default=DEFAULT_CACHE_SIZE / 1024 / 1024)
+    parser.add_argument('--refresh', help='Download every page again instead of revalidating the cache',
+                        action='store_true')
+    parser.add_argument('--parse-cache', help='File to keep the fields parsed from pages in, pages that are unchanged '
+                        'on later runs are not parsed again')
+    parser.add_argument('--parse-cache-size', help='Maximum size of the parse cache in MB',
+                        type=float, default=DEFAULT_PARSE_CACHE_SIZE / 1024 / 1024)
+    parser.add_argument('--incremental', help='Only scrape entries that are new or changed since the last export',
+                        action='store_true')
+    parser.add_argument('--parsers', help='Number of processes parsing pages while others are downloaded (0 parses in the workers)',
+                        type=int, default=0)
+    parser.add_argument('--parser', help='BeautifulSoup backend used to parse pages, auto uses lxml when it is installed',
+                        choices=('auto',) + BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument('--restricted-parse', help='Only parse the #page-content part of every page',
+                        action='store_true')
+    parser.add_argument('--resume', help='Keep the records written by an interrupted scrape and continue from there',
+                        action='store_true')
+    parser.add_argument('--format', help='Export as a JSON array, as JSON Lines or as JSON Lines compressed with gzip or zstd, '
+                        'with an offset index to read single records',
+                        choices=FORMATS, default='json')
+    parser.add_argument('--output-dir', help='Directory to write the exports to, along with their fingerprints, failed rows and index dumps '
+                        '(default the current directory)')
+    parser.add_argument('--retry-failed', help='Only scrape again the pages that failed in the last scrape, '
+                        'listed in e.g. exported_spells.failed.jsonl, and patch them into the export', action='store_true')
+    parser.add_argument('--text-format', help='Export the descriptions of spells and feats as html or as markdown, like the text of magic items',
+                        choices=TEXT_FORMATS, default='html')
+    parser.add_argument('--archive', help='Also append every fetched page to this archive, to parse them again later with --reparse-from',
+                        metavar='PATH')
+    parser.add_argument('--reparse-from', help='Build the exports from the pages of an archive instead of the site, '
+                        'parsing with --parsers processes (default one per CPU). Without -f/-m/-s every content type in the archive is built',
+                        metavar='ARCHIVE')
+    parser.add_argument('--rederive', help='Recompute the fields of a spell export that come from the index, from the '
+                        'spells.json next to it, without fetching any page', metavar='EXPORT')
+    parser.add_argument('--metrics', help='File to write the counters and latency histograms of the run to')
+    parser.add_argument('--profile', help='File to write a cProfile of the page parsing to, a summary is printed as well')
+    parser.add_argument('--combined', help='Scrape the selected content types at the same time, sharing --workers and --rate',
+                        action='store_true')
+    parser.add_argument('--no-index-dump', help="Don't save the index rows to magic_items.json and spells.json next to the exports",
+                        action='store_true')
+    parser.add_argument('--sqlite', help='Also write every record to this SQLite database, with indexes and full text search',
+                        metavar='PATH')
+    parser.add_argument('--columnar', help='Also write every export as memory mappable NumPy columns, e.g. exported_spells.columns',
+                        action='store_true')
+
+    commands = parser.add_subparsers(dest='command', title='commands', action=CommandsAction)
+    query_parser = commands.add_parser('query', help='Filter an export of spells, magic items or feats')
+    query_parser.add_argument('export', help='The export to filter, e.g. exported_spells.json')
+    query_parser.add_argument('--where', help='Keep the records with one of the values, e.g. level=0-3 or classes=Wizard,Sorcerer',
+                              type=parse_condition, action='append', default=[], metavar='FIELD=VALUE')
+    query_parser.add_argument('--without', help='Drop the records with one of the values, e.g. components=Material',
+                              type=parse_condition, action='append', default=[], metavar='FIELD=VALUE')
+    query_parser.add_argument('--fields', help='Comma separated fields to print for every record, e.g. name,url')
+    query_parser.add_argument('--count', help='Only print the number of matching records', action='store_true')
+    queue_parser = commands.add_parser('queue', help='Crawl with any number of workers sharing a work queue')
+    queue_parser.add_argument('action', help='fill: queue the rows of the index pages selected with -f/-m/-s, '
+                              'work: scrape queued rows to a shard, status: count the rows, merge: merge the shards into the exports',
+                              choices=('fill', 'work', 'status', 'merge'))
+    queue_parser.add_argument('queue', help='The SQLite file of the queue, shared by the workers, e.g. crawl.db')
+    queue_parser.add_argument('--shards', help='Directory of the shards, defaults to the queue with .shards as extension')
+    queue_parser.add_argument('--worker', help='Name of this worker, unique among the workers (default host name and pid)')
+    queue_parser.add_argument('--batch-size', help='Number of rows claimed at a time',
+                              type=int, default=DEFAULT_BATCH_SIZE)
+    queue_parser.add_argument('--lease', help='Seconds a worker has to finish a batch before others can claim it',
+                              type=float, default=DEFAULT_LEASE)
+    serve_parser = commands.add_parser('serve', help='Serve the exports selected with -f/-m/-s (all by default) over HTTP '
+                                       'from memory, scraping them again in the background')
+    serve_parser.add_argument('--host', help='Address to listen on', default='127.0.0.1')
+    serve_parser.add_argument('--port', help='Port to listen on', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--rescrape-interval', help='Seconds between two scrapes refreshing the exports, '
+                              'with the options given before `serve` (0 to only serve the exports)',
+                              type=float, default=DEFAULT_RESCRAPE_INTERVAL)
+    query_parser.set_defaults(error=query_parser.error)
+    return parser
+
+
+def export_columns(dnd_scraper: DNDScraper) -> None:
+    """
+    Writes the columnar copy of the export of a scraper.
+    """
+    from columnar import columns_path, write_columns
+    write_columns(read_export(dnd_scraper.file_name), dnd_scraper.class_parse.__name__,
+                  columns_path(dnd_scraper.file_name))
+
+
+def scrape(args: argparse.Namespace, type_grab: str, fetcher: Fetcher, sqlite: (SQLiteExport | None)) -> None:
+    """
+    Scrapes one content type to its own export.
+    """
+    from dnd_scraper import DNDScraper
+    print(f"Scraping {CONTENT_TYPES[type_grab]}...")
+    dnd_scraper = DNDScraper(type_grab, fetcher, args.incremental,
+                             args.parsers, args.resume, args.format, sqlite,
+                             dump_index=not args.no_index_dump, output_dir=args.output_dir)
+    dnd_scraper.close_file()
+    if dnd_scraper.dead_letters:
+        print(f"{len(dnd_scraper.dead_letters)} {CONTENT_TYPES[type_grab]} failed, "
+              f"see {dnd_scraper.dead_letters.path} and run again with --retry-failed")
+    if args.columnar:
+        export_columns(dnd_scraper)
+
+
+def retry(args: argparse.Namespace, type_grab: str, fetcher: Fetcher, sqlite: (SQLiteExport | None)) -> None:
+    """
+    Scrapes again the failed pages of one content type.
+    """
+    from dnd_scraper import retry_failed
+    print(f"Retrying failed {CONTENT_TYPES[type_grab]}...")
+    retried, failed = retry_failed(type_grab, fetcher, args.format, sqlite, args.output_dir)
+    print(f"{retried - failed} of {retried} {CONTENT_TYPES[type_grab]} recovered")
+
+
+def run_queue(args: argparse.Namespace, fetcher: (Fetcher | None) = None) -> None:
+    """
+    Runs an action of the `queue` command, `fill` and `work` need a fetcher.
+    """
+    from work_queue import WorkQueue, merge_shards, run_worker, shards_path
+    queue = WorkQueue(args.queue)
+    shard_dir = args.shards or shards_path(args.queue)
+    try:
+        match args.action:
+            case "fill":
+                from dnd_scraper import DNDScraper
+                for type_grab in CONTENT_TYPES:
+                    if getattr(args, type_grab):
+                        rows = DNDScraper(type_grab, fetcher, dump_index=False, scrape=False).list_info
+                        print(f"Queued {queue.fill(type_grab, rows)} {CONTENT_TYPES[type_grab]}")
+            case "work":
+                written = run_worker(queue, fetcher, shard_dir, args.worker, args.batch_size, args.lease)
+                print(f"Wrote {written} records to {shard_dir}")
+            case "status":
+                for type_grab, counts in queue.status().items():
+                    print(f"{CONTENT_TYPES[type_grab]}: {counts['done']} done, "
+                          f"{counts['leased']} leased, {counts['waiting']} waiting")
+            case "merge":
+                for type_grab, merged in merge_shards(queue, shard_dir, args.format, args.output_dir).items():
+                    print(f"Merged {merged} {CONTENT_TYPES[type_grab]}")
+    finally:
+        queue.close()
+
+
+def run_query(args: argparse.Namespace) -> None:
+    """
+    Prints the records of an export matching the conditions of the `query` command as JSON Lines.
+    """
+    from query import QueryIndex, rows
+    try:
+        index = QueryIndex.load(args.export)
+    except (OSError, ValueError) as e:
+        args.error(str(e))
+    bitmap = index.all
+    try:
+        for name, values in args.where:
+            bitmap &= index.match(name, values)
+        for name, values in args.without:
+            bitmap &= ~index.match(name, values)
+    except KeyError as e:
+        args.error(f"{e} is not indexed, the indexed fields are: {', '.join(index.bitmaps)}")
+
+    if args.count:
+        print(bitmap.bit_count())
+        return
+    fields = args.fields.split(",") if args.fields else None
+    for i in rows(bitmap):
+        record = index.records[i]
+        if fields:
+            record = {name: record.get(name) for name in fields}
+        print(json.dumps(record, ensure_ascii=False))
+
+
+def run_serve(args: argparse.Namespace, argv: list[str]) -> None:
+    """
+    Serves the exports of the `serve` command until interrupted.
+    """
+    from lookup_server import LookupServer, LookupService
+    type_grabs = [type_grab for type_grab in CONTENT_TYPES if getattr(args, type_grab)] or list(CONTENT_TYPES)
+    # the options before `serve` are the ones of the scrape refreshing the exports, `serve` can also be an option value
+    scrape_argv = argv[:len(argv) - len(args.command_argv)]
+    if not any(getattr(args, type_grab) for type_grab in CONTENT_TYPES):
+        scrape_argv += ["-f", "-m", "-s"]
+    service = LookupService(type_grabs, args.format, scrape_argv, args.rescrape_interval, args.output_dir)
+    for type_grab, error in service.errors.items():
+        print(f"Could not load the {CONTENT_TYPES[type_grab]}: {error}", file=sys.stderr)
+    server = LookupServer(service.start(), args.host, args.port)
+    print(f"Serving {', '.join(CONTENT_TYPES[type_grab] for type_grab in service.snapshot.collections)} "
+          f"on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+def main(argv: (list[str] | None) = None) -> None:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "query":
+        run_query(args)
+        return
+    if args.command == "serve":
+        run_serve(args, sys.argv[1:] if argv is None else argv)
+        return
+    if args.rederive:
+        from dnd_scraper import rederive_export
+        try:
+            print(f"Re-derived {rederive_export(args.rederive)} spells in {args.rederive}")
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        return
+    if not (args.feats or args.magic_item or args.spells or args.reparse_from) and (
+            args.command != "queue" or args.action == "fill"):
         print("Please select at least one option: -f, -m, -s")
-        exit()
-
-    if args.feats:
-        print("Scraping feats...")
-        dnd_scraper = DNDScraper("feats")
-        dnd_scraper.close_file()
-    if args.magic_item:
-        print("Scraping magic items...")
-        dnd_scraper = DNDScraper("magic_item")
-        dnd_scraper.close_file()
-    if args.spells:
-        print("Scraping spells...")
-        dnd_scraper = DNDScraper("spells")
-        dnd_scraper.close_file()
-    
\ No newline at end of file
+        return
+    if args.archive and args.reparse_from:
+        parser.error("--archive can't be used with --reparse-from, the pages already come from an archive")
+    if args.profile and args.parsers:
+        parser.error("--profile only follows the parsing done in this process, it can't be used with --parsers")
+    if args.columnar:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            parser.error("--columnar needs numpy, install it with: pip install numpy")
+    if args.format == "jsonl.zst":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            parser.error("--format jsonl.zst needs zstandard, install it with: pip install zstandard")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    if args.command == "queue" and args.action in ("status", "merge"):
+        # nothing is fetched, the queue and its shards are only read
+        run_queue(args)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from fetcher import Fetcher
+    from http_cache import HTTPCache
+    from metrics import METRICS, PROFILER
+    import page_parser
+    from sqlite_export import SQLiteExport
+
+    if args.profile:
+        PROFILER.enable()
+    page_parser.configure(args.parser, args.restricted_parse, args.text_format)
+    if args.parse_cache:
+        import parse_cache
+        parse_cache.configure(args.parse_cache, int(args.parse_cache_size * 1024 * 1024))
+    if args.reparse_from:
+        from fetcher import ArchiveFetcher
+        from page_archive import ArchiveReader
+        fetcher = ArchiveFetcher(ArchiveReader(args.reparse_from), args.workers)
+        # nothing waits on the network, the parsing is all there is to spread
+        if not args.parsers and not args.profile:
+            args.parsers = os.cpu_count() or 1
+    else:
+        from page_archive import PageArchive
+        cache = HTTPCache(args.cache, int(args.cache_size * 1024 * 1024)) if args.cache else None
+        archive = PageArchive(args.archive) if args.archive else None
+        fetcher = Fetcher(args.workers, args.rate, args.timeout, args.retries, cache=cache, refresh=args.refresh,
+                          adaptive=args.adaptive, max_rate=args.max_rate, archive=archive)
+    sqlite = SQLiteExport(args.sqlite) if args.sqlite else None
+
+    if args.command == "queue":
+        run_queue(args, fetcher)
+        type_grabs = []
+    else:
+        type_grabs = [type_grab for type_grab in CONTENT_TYPES if getattr(args, type_grab)]
+        if not type_grabs:
+            from dnd_scraper import index_url
+            type_grabs = [type_grab for type_grab in CONTENT_TYPES if index_url(type_grab) in fetcher.reader]
+    run = retry if args.retry_failed else scrape
+    # `queue` and an archive without index pages leave nothing to combine
+    if args.combined and type_grabs:
+        with ThreadPoolExecutor(len(type_grabs)) as executor:
+            # consumed so an error in any of the scrapes is raised here
+            list(executor.map(lambda type_grab: run(args, type_grab, fetcher, sqlite), type_grabs))
+    else:
+        for type_grab in type_grabs:
+            run(args, type_grab, fetcher, sqlite)
+
+    fetcher.close()
+    if sqlite:
+        sqlite.close()
+    if args.metrics:
+        METRICS.write(args.metrics)
+    if args.profile:
+        print(PROFILER.report(args.profile))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    """
+    Counts observations into the `LATENCY_BUCKETS`, plus one bucket for anything slower.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+
+    def merge(self, other: dict) -> None:
+        """
+        Adds the observations of a histogram exported with `to_dict`.
+        """
+        if not other["count"]:
+            return
+        self.count += other["count"]
+        self.total += other["sum"]
+        self.min = other["min"] if self.min is None else min(self.min, other["min"])
+        self.max = other["max"] if self.max is None else max(self.max, other["max"])
+        for i, bucket_count in enumerate(other["buckets"].values()):
+            self.buckets[i] += bucket_count
+
+    def to_dict(self) -> dict:
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ["inf"]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0,
+            "min": self.min,
+            "max": self.max,
+            "buckets": dict(zip(bounds, self.buckets)),
+        }
+
+
+class Metrics:
+    """
+    Thread safe counters and latency histograms for the stages of a scrape.
+    """
+
+    def __init__(self) -> None:
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Records how long the block takes in the histogram `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {name: histogram.to_dict()
+                               for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def merge(self, other: dict) -> None:
+        """
+        Adds the metrics exported with `to_dict`, e.g. from another process.
+        """
+        with self._lock:
+            for name, value in other["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, histogram in other["histograms"].items():
+                self.histograms.setdefault(name, Histogram()).merge(histogram)
+
+    def drain(self) -> dict:
+        """
+        Exports the metrics and starts over from zero.
+        """
+        exported = self.to_dict()
+        self.reset()
+        return exported
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def write(self, path: str) -> None:
+        """
+        Writes the metrics to a JSON file.
+        """
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+
+
+def timed(name: str):
+    """
+    Decorator recording every call of the function in the histogram `name` of `METRICS`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler:
+    """
+    Runs cProfile over the blocks wrapped in `with PROFILER:` once enabled. The
+    blocks are run one at a time since a profile can only follow one thread.
+    """
+
+    def __init__(self) -> None:
+        self.profile = None
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        if self.profile is not None:
+            self._lock.acquire()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.disable()
+            self._lock.release()
+        return False
+
+    def report(self, path: str, limit: int = 30) -> str:
+        """
+        Dumps the profile to `path`, readable with `pstats`, and formats the top functions.
+
+        Returns:
+            str: The `limit` functions with the highest cumulative time
+        """
+        self.profile.dump_stats(path)
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats(
+            "cumulative").print_stats(limit)
+        return output.getvalue()
+
+
+METRICS = Metrics()
+PROFILER = Profiler()
+
+
+def profiled(func):
+    """
+    Decorator running the function under `PROFILER`.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with PROFILER:
+            return func(*args, **kwargs)
+    return wrapper
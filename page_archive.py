@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import hashlib
+import json
+import mmap
+import os
+import threading
+import zlib
+
+
+def index_path(archive_path: str) -> str:
+    """
+    Gets the path of the offset index of an archive, e.g. `pages.archive.idx`.
+    """
+    return archive_path + ".idx"
+
+
+@dataclass
+class ArchivedPage:
+    url: str
+    fetched_at: str
+    sha256: str
+    encoding: (str | None)
+    body: bytes
+
+
+def _read_index(path: str) -> tuple[dict[str, dict], int, int]:
+    """
+    Reads the complete lines of an index, the last entry of a url wins.
+
+    Returns:
+        tuple: The entries keyed by url, the end of the last page in the archive
+            and the size of the complete lines of the index
+    """
+    entries = {}
+    end = size = 0
+    if os.path.exists(path):
+        with open(path, "rb") as index:
+            for line in index:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                entries[entry["url"]] = entry
+                end = max(end, entry["offset"] + entry["length"])
+                size += len(line)
+    return entries, end, size
+
+
+class PageArchive:
+    """
+    Appends every fetched page to a single file, each body compressed on its
+    own with zlib. The offset index `<path>.idx` gets a JSON line per page with
+    its url, fetch time, SHA-256 of the body, encoding and byte range.
+
+    A page whose body hasn't changed since it was last archived isn't stored
+    again, so later scrapes into the same archive only add what changed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        entries, end, size = _read_index(index_path(path))
+        self._hashes = {url: entry["sha256"] for url, entry in entries.items()}
+        # drop the page an earlier run was writing when it stopped
+        self._file = open(path, "r+b" if os.path.exists(path) else "wb")
+        self._file.seek(end)
+        self._file.truncate()
+        self._index = open(index_path(path), "a", encoding="utf-8")
+        self._index.truncate(size)
+
+    def add(self, url: str, body: bytes, encoding: (str | None) = None) -> None:
+        """
+        Archives a page.
+
+        Args:
+            url: The url the page was fetched from
+            body: The body of the response
+            encoding: The encoding of the body, if the server gave one
+        """
+        sha256 = hashlib.sha256(body).hexdigest()
+        if self._hashes.get(url) == sha256:
+            return
+        data = zlib.compress(body)
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            self._index.write(json.dumps({
+                "url": url,
+                "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "sha256": sha256,
+                "encoding": encoding,
+                "offset": offset,
+                "length": len(data),
+            }) + "\n")
+            self._index.flush()
+            self._hashes[url] = sha256
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+
+class ArchiveReader:
+    """
+    Reads the pages of an archive written by `PageArchive`. The archive is
+    memory mapped and only the pages asked for are decompressed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries, _, _ = _read_index(index_path(path))
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.entries
+
+    def get(self, url: str) -> (ArchivedPage | None):
+        """
+        Gets the last archived copy of a page.
+
+        Returns:
+            ArchivedPage | None: The page, None if it isn't in the archive
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        body = zlib.decompress(self._data[entry["offset"]:entry["offset"] + entry["length"]])
+        return ArchivedPage(url, entry["fetched_at"], entry["sha256"], entry["encoding"], body)
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
@@ -0,0 +1,90 @@
+import re
+
+from bs4 import Comment, Doctype, NavigableString, PageElement, Tag
+from markdownify import MarkdownConverter
+
+# options every page is converted with
+PAGE_OPTIONS = {"strip": ["scripts", "page-tags"], "autolinks": False}
+
+_WHITESPACE = re.compile(r'[\t ]+')
+_ESCAPE_MISC = re.compile(r'([\\&<`[>~#=+|-])')
+_ESCAPE_NUMBERED = re.compile(r'([0-9])([.)])')
+
+
+class TreeMarkdownConverter(MarkdownConverter):
+    """
+    The converter of markdownify, for elements of a page that is already parsed,
+    so the page doesn't go back to html and through a second parse first.
+
+    markdownify looks through the parents of every text for a `pre` or `code`
+    element, here they are counted on the way down the tree instead. The output
+    is the same as `markdownify(str(element))`.
+    """
+
+    def __init__(self, **options) -> None:
+        super().__init__(**options)
+        self._preformatted = 0
+        self._code = 0
+
+    def process_tag(self, node: Tag, convert_as_inline: bool, children_only: bool = False) -> str:
+        preformatted = node.name == "pre"
+        code = node.name in ("pre", "code", "kbd", "samp")
+        self._preformatted += preformatted
+        self._code += code
+        try:
+            return super().process_tag(node, convert_as_inline, children_only)
+        finally:
+            self._preformatted -= preformatted
+            self._code -= code
+
+    def process_text(self, el: NavigableString) -> str:
+        text = str(el)
+        if not self._preformatted:
+            text = _WHITESPACE.sub(' ', text)
+        if not self._code:
+            text = self.escape(text)
+        if el.parent.name == 'li' and (not el.next_sibling or el.next_sibling.name in ('ul', 'ol')):
+            text = text.rstrip()
+        return text
+
+    def escape(self, text: str) -> str:
+        if not text:
+            return ''
+        if self.options['escape_misc']:
+            text = _ESCAPE_MISC.sub(r'\\\1', text)
+            text = _ESCAPE_NUMBERED.sub(r'\1\\\2', text)
+        if self.options['escape_asterisks']:
+            text = text.replace('*', r'\*')
+        if self.options['escape_underscores']:
+            text = text.replace('_', r'\_')
+        return text
+
+    def convert_elements(self, elements: list[PageElement]) -> str:
+        """
+        Converts a run of sibling elements, e.g. some of the paragraphs of a page.
+        """
+        text = ''
+        for element in elements:
+            if isinstance(element, Tag):
+                text += self.process_tag(element, convert_as_inline=False)
+            elif isinstance(element, NavigableString) and not isinstance(element, (Comment, Doctype)):
+                text += self.process_text(element)
+        return text
+
+
+def to_markdown(element: (Tag | list[PageElement]), **options) -> str:
+    """
+    Converts a parsed element, or a list of sibling elements, to markdown.
+
+    Args:
+        element: The element whose children are converted, e.g. the `#page-content` of a page,
+            or the elements to convert
+        options: Options of markdownify, defaults to `PAGE_OPTIONS`
+
+    Returns:
+        str: The markdown
+    """
+    converter = TreeMarkdownConverter(**(options or PAGE_OPTIONS))
+    if isinstance(element, Tag):
+        return converter.convert_soup(element)
+    return converter.convert_elements(element)
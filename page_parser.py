@@ -0,0 +1,112 @@
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer, Tag
+
+from defaults import BACKENDS, DEFAULT_BACKEND, TEXT_FORMATS
+
+# every page we scrape only uses what is inside this element
+PAGE_CONTENT_ID = "page-content"
+
+_backend = DEFAULT_BACKEND
+_restricted = False
+_text_format = "html"
+
+
+def available_backends() -> list[str]:
+    """
+    Lists the parser backends BeautifulSoup can use in this environment.
+
+    Returns:
+        list[str]: The names of the installed backends
+    """
+    available = []
+    for backend in BACKENDS:
+        try:
+            BeautifulSoup("", backend)
+        except FeatureNotFound:
+            continue
+        available.append(backend)
+    return available
+
+
+def configure(backend: (str | None) = None, restricted: (bool | None) = None,
+              text_format: (str | None) = None) -> None:
+    """
+    Sets how pages are parsed from now on.
+
+    Args:
+        backend: The BeautifulSoup backend, 'auto' picks lxml when it is installed
+        restricted: Only build the tree of `#page-content` instead of the whole page
+        text_format: One of `TEXT_FORMATS`, the format of the descriptions of spells and feats
+
+    Raises:
+        ValueError: Raises an error if the backend isn't installed or the text format is unknown
+    """
+    global _backend, _restricted, _text_format
+    if backend == "auto":
+        backend = "lxml" if "lxml" in available_backends() else DEFAULT_BACKEND
+    if backend is not None:
+        if backend not in available_backends():
+            raise ValueError(f'Parser backend {backend} is not installed')
+        _backend = backend
+    if restricted is not None:
+        _restricted = restricted
+    if text_format is not None:
+        if text_format not in TEXT_FORMATS:
+            raise ValueError(f'Unknown text format {text_format}')
+        _text_format = text_format
+
+
+def settings() -> tuple[str, bool, str]:
+    """
+    Gets the current settings, to hand them to `configure` in another process.
+
+    Returns:
+        tuple[str, bool, str]: The backend, whether parsing is restricted and the text format
+    """
+    return _backend, _restricted, _text_format
+
+
+def text_format() -> str:
+    return _text_format
+
+
+def parse_page(markup: (str | bytes)) -> (Tag | None):
+    """
+    Parses a wikidot page and finds its `#page-content` element.
+
+    In restricted mode the parser skips everything outside of `#page-content`,
+    so the navigation, side bars and scripts never become part of the tree.
+
+    Args:
+        markup: The html of the page
+
+    Returns:
+        Tag | None: The `#page-content` element, or None if the page doesn't have one
+    """
+    if _restricted:
+        soup = BeautifulSoup(markup, _backend,
+                             parse_only=SoupStrainer(id=PAGE_CONTENT_ID))
+    else:
+        soup = BeautifulSoup(markup, _backend)
+    return soup.find(id=PAGE_CONTENT_ID)
+
+
+def release_page(page: (Tag | None)) -> None:
+    """
+    Frees the whole tree of a page found with `parse_page` once nothing else is
+    read from it. The trees are full of reference cycles, so otherwise they stay
+    in memory until the garbage collector gets to them.
+
+    Args:
+        page: The element returned by `parse_page`
+    """
+    if page is None:
+        return
+    while page.parent is not None:
+        page = page.parent
+    # the root of the tree doesn't link to its first element, so its children are freed one by one
+    for element in list(page.contents):
+        if isinstance(element, Tag):
+            element.decompose()
+        else:
+            element.extract()
+    page.decompose()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+
+from defaults import DEFAULT_PARSE_CACHE_SIZE
+from metrics import METRICS
+import page_parser
+from sqlite_lru import SQLiteLRU
+
+
+class ParseCache:
+    """
+    An on disk cache of the fields parsed from pages, keyed by the hash of the
+    page body, in a single SQLite file shared by the parser processes.
+
+    Every kind of record has a version, the version of its parser. Entries of
+    older versions are deleted the first time a newer version is looked up,
+    so a fixed parser never reads what the broken one wrote. Once the entries
+    grow past `max_size` bytes the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_PARSE_CACHE_SIZE) -> None:
+        self.path = path
+        self.max_size = max_size
+        self._checked: set[tuple[str, int]] = set()
+        self._results = SQLiteLRU(path, "results", "key", ("kind TEXT NOT NULL", "version INTEGER NOT NULL",
+                                                           "fields TEXT NOT NULL"), max_size)
+
+    def get(self, kind: str, version: int, key: str) -> (dict | None):
+        """
+        Looks up the fields parsed from a page and marks them as recently used.
+
+        Args:
+            kind: The kind of record, e.g. 'Spell'
+            version: The version of the parser of the kind
+            key: The key of the page, from `page_key`
+
+        Returns:
+            dict | None: The fields, or None if the page wasn't parsed with this version
+        """
+        if (kind, version) not in self._checked:
+            self._results.delete("kind = ? AND version != ?", (kind, version))
+            self._checked.add((kind, version))
+        row = self._results.get(key, "fields", "version = ?", (version,))
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, kind: str, version: int, key: str, fields: dict) -> None:
+        """
+        Stores the fields parsed from a page, evicting the least recently used entries if the cache is full.
+        """
+        encoded = json.dumps(fields, ensure_ascii=False)
+        self._results.put(key, (kind, version, encoded), len(encoded))
+
+    def close(self) -> None:
+        self._results.close()
+
+
+_cache: (ParseCache | None) = None
+
+
+def configure(path: (str | None) = None, max_size: int = DEFAULT_PARSE_CACHE_SIZE) -> None:
+    """
+    Sets the cache the records parse their pages through from now on, None turns it off.
+    """
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = ParseCache(path, max_size) if path else None
+
+
+def settings() -> tuple[(str | None), int]:
+    """
+    Gets the current settings, to hand them to `configure` in another process.
+    """
+    return (_cache.path, _cache.max_size) if _cache is not None else (None, DEFAULT_PARSE_CACHE_SIZE)
+
+
+def page_key(html: (str | bytes), *inputs: object) -> str:
+    """
+    Hashes a page body with everything else the parsed fields depend on: the
+    parse settings of `page_parser` and the `inputs` taken from the index row.
+    """
+    digest = hashlib.sha256(html.encode("utf-8") if isinstance(html, str) else html)
+    digest.update(json.dumps([page_parser.settings(), inputs]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def lookup(kind: str, version: int, html: (str | bytes), *inputs: object) -> tuple[(str | None), (dict | None)]:
+    """
+    Looks up the fields of a page in the configured cache.
+
+    Args:
+        kind: The kind of record, e.g. 'Spell'
+        version: The version of the parser of the kind
+        html: The page
+        inputs: Whatever else the fields depend on, as JSON values
+
+    Returns:
+        tuple: The key to `store` the fields under once they are parsed and the
+            cached fields, None for both when there is no cache
+    """
+    if _cache is None:
+        return None, None
+    key = page_key(html, *inputs)
+    fields = _cache.get(kind, version, key)
+    METRICS.incr("parse_cache.hits" if fields is not None else "parse_cache.misses")
+    return key, fields
+
+
+def store(kind: str, version: int, key: (str | None), fields: dict) -> None:
+    """
+    Stores the fields parsed from a page under the key given by `lookup`.
+    """
+    if _cache is not None and key is not None:
+        _cache.put(kind, version, key, fields)
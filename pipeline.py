@@ -0,0 +1,176 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+import queue
+import threading
+from typing import Callable, Iterator
+
+from fetcher import Fetcher
+from incremental import row_url
+from metrics import METRICS
+import page_parser
+import parse_cache
+
+DEFAULT_QUEUE_SIZE = 32
+
+# marks the end of the items put on a queue by a stage
+_DONE = object()
+
+
+def row_name(row: dict[str, str]) -> str:
+    """
+    Gets the name of an index row, from its 'Spell Name', 'Feat Name' or 'Item Name' column.
+    """
+    return next((value for column, value in row.items() if column.endswith(" Name")), row_url(row))
+
+
+def _finished(result: tuple[str, dict | None]) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _failed(exception: Exception) -> Future:
+    future = Future()
+    future.set_exception(exception)
+    return future
+
+
+def parse_record(class_parse: type, info: dict[str, str], html: str) -> tuple[str, dict]:
+    """
+    Builds a record from an already downloaded page. Runs in the parser processes.
+
+    Args:
+        class_parse: The class of the record, `Spell`, `Feats` or `MagicItem`
+        info: The index row of the record
+        html: The detail page of the record
+
+    Returns:
+        tuple[str, dict]: The record as a JSON string and the metrics recorded while parsing it
+    """
+    record = class_parse(info, html=html).to_json_str()
+    return record, METRICS.drain()
+
+
+def configure_parser(parser_settings: tuple, cache_settings: tuple) -> None:
+    """
+    Sets up a parser process to parse pages the same way as the process that started it.
+    """
+    page_parser.configure(*parser_settings)
+    parse_cache.configure(*cache_settings)
+    # a forked process starts with the counters of its parent, they are already counted there
+    METRICS.reset()
+
+
+class Pipeline:
+    """
+    Scrapes records in three stages joined by bounded queues:
+
+    - the fetcher's worker threads download the detail pages,
+    - a pool of `parsers` processes parse the pages with `parse_record`,
+    - the caller iterates over `run` and writes the records out in index order.
+
+    Keeping the parsing in other processes stops BeautifulSoup from holding the
+    GIL while the fetch threads are waiting on the network.
+    """
+
+    def __init__(self, class_parse: type, fetcher: Fetcher, parsers: int,
+                 queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        self.class_parse = class_parse
+        self.fetcher = fetcher
+        self.parsers = max(1, parsers)
+        self.queue_size = queue_size
+
+    def run(self, rows: list[dict[str, str]],
+            lookup: (Callable[[dict[str, str]], str | None] | None) = None,
+            on_error: (Callable[[dict[str, str], Exception], None] | None) = None) -> Iterator[str | None]:
+        """
+        Scrapes the rows through the pipeline.
+
+        Args:
+            rows: The index rows to scrape
+            lookup: Returns an already finished record for a row, or None if the row has to be scraped
+            on_error: Called with the row and the error when a row fails, the error is raised without it
+
+        Returns:
+            Iterator[str | None]: The records as JSON strings, in the same order as `rows`,
+                None for the rows that failed
+        """
+        todo = queue.SimpleQueue()
+        for row in enumerate(rows):
+            todo.put(row)
+        fetched = queue.Queue(self.queue_size)
+        parsed = queue.Queue(self.queue_size)
+
+        with ProcessPoolExecutor(max_workers=self.parsers, initializer=configure_parser,
+                                 initargs=(page_parser.settings(), parse_cache.settings())) as pool:
+            fetch_threads = [threading.Thread(target=self._fetch, args=(todo, fetched, parsed, lookup),
+                                              daemon=True)
+                             for _ in range(self.fetcher.workers)]
+            for thread in fetch_threads:
+                thread.start()
+            threading.Thread(target=self._dispatch, args=(pool, fetched, parsed, len(fetch_threads)),
+                             daemon=True).start()
+
+            # the records can finish out of order, hold them until it's their turn
+            pending = {}
+            next_record = 0
+            while (item := parsed.get()) is not _DONE:
+                i, future = item
+                pending[i] = future
+                while next_record in pending:
+                    try:
+                        record, metrics = pending.pop(next_record).result()
+                    except Exception as e:
+                        if on_error is None:
+                            raise
+                        on_error(rows[next_record], e)
+                        record, metrics = None, None
+                    if metrics is not None:
+                        METRICS.merge(metrics)
+                    yield record
+                    next_record += 1
+
+    def _fetch(self, todo: queue.SimpleQueue, fetched: queue.Queue, parsed: queue.Queue,
+               lookup: (Callable[[dict[str, str]], str | None] | None)) -> None:
+        """
+        Fetch stage, downloads pages until there are no rows left.
+        """
+        try:
+            while True:
+                try:
+                    i, row = todo.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    record = lookup(row) if lookup else None
+                    if record is not None:
+                        parsed.put((i, _finished((record, None))))
+                        continue
+                    response = self.fetcher.get(row_url(row))
+                    if response.status_code == 200:
+                        fetched.put((i, row, response.text))
+                    else:
+                        # fails the same way as the records fetching the page themselves,
+                        # without fetching it again
+                        parsed.put((i, _failed(LookupError(
+                            f'Could not find {row_name(row)} using this URL: {response.url or row_url(row)}'))))
+                except Exception as e:
+                    parsed.put((i, _failed(e)))
+        finally:
+            fetched.put(_DONE)
+
+    def _dispatch(self, pool: ProcessPoolExecutor, fetched: queue.Queue, parsed: queue.Queue,
+                  fetchers: int) -> None:
+        """
+        Parse stage, hands the downloaded pages to the parser processes.
+        """
+        while fetchers:
+            item = fetched.get()
+            if item is _DONE:
+                fetchers -= 1
+                continue
+            i, row, html = item
+            try:
+                parsed.put((i, pool.submit(parse_record, self.class_parse, row, html)))
+            except Exception as e:
+                parsed.put((i, _failed(e)))
+        parsed.put(_DONE)
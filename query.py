@@ -0,0 +1,139 @@
+import argparse
+from collections.abc import Iterable
+import re
+
+from export_writer import read_export
+
+# fields of the exported records that get a bitmap for every value, list fields
+# like classes get a bitmap for every member
+SPELL_FIELDS = ("level", "school", "classes", "components", "is_ritual",
+                "is_concentration", "cast_type", "range_type")
+MAGIC_ITEM_FIELDS = ("rarity", "type", "source", "attuned")
+FEAT_FIELDS = ("has_prerequisite",)
+
+
+class QueryIndex:
+    """
+    Bitmap indexes over exported records. Every value of an indexed field has a
+    bitmap, an int with bit i set when record i has the value, so a filter is a
+    few AND/OR/NOT operations on ints instead of a scan of the records, e.g. the
+    wizard rituals of level 3 or lower without material components:
+
+        spells = QueryIndex.load("exported_spells.json")
+        spells.find(level=range(4), classes="Wizard", is_ritual=True,
+                    without={"components": "Material"})
+    """
+
+    def __init__(self, records: list[dict], fields: Iterable[str]) -> None:
+        self.records = records
+        self.all = (1 << len(records)) - 1
+        self.bitmaps: dict[str, dict[object, int]] = {}
+        for name in fields:
+            positions: dict[object, list[int]] = {}
+            for i, record in enumerate(records):
+                values = record[name]
+                for value in (set(values) if isinstance(values, list) else (values,)):
+                    positions.setdefault(value, []).append(i)
+            self.bitmaps[name] = {value: sum(1 << i for i in value_positions)
+                                  for value, value_positions in positions.items()}
+
+    @classmethod
+    def load(cls, path: str) -> "QueryIndex":
+        """
+        Indexes an export in either format, spells, magic items or feats are told apart by their fields.
+
+        Args:
+            path: The path of the export
+
+        Raises:
+            ValueError: Raises an error if the export isn't of spells, magic items or feats
+
+        Returns:
+            QueryIndex: The index of the export
+        """
+        records = read_export(path)
+        for fields in (SPELL_FIELDS, MAGIC_ITEM_FIELDS, FEAT_FIELDS):
+            if not records or all(name in records[0] for name in fields):
+                return cls(records, fields)
+        raise ValueError(f'{path} is not an export of spells, magic items or feats')
+
+    def match(self, name: str, values: object) -> int:
+        """
+        Gets the bitmap of the records having any of the values for a field.
+
+        Args:
+            name: The indexed field
+            values: A value, or any iterable of values such as a list or a range
+
+        Raises:
+            KeyError: Raises an error if the field isn't indexed
+
+        Returns:
+            int: The bitmap of the matching records
+        """
+        bitmaps = self.bitmaps[name]
+        if isinstance(values, (str, bool, int)):
+            return bitmaps.get(values, 0)
+        bitmap = 0
+        for value in values:
+            bitmap |= bitmaps.get(value, 0)
+        return bitmap
+
+    def bitmap(self, without: (dict[str, object] | None) = None, **where: object) -> int:
+        """
+        Gets the bitmap of the records matching every condition of `where` and
+        none of the conditions of `without`.
+        """
+        bitmap = self.all
+        for name, values in where.items():
+            bitmap &= self.match(name, values)
+        for name, values in (without or {}).items():
+            bitmap &= ~self.match(name, values)
+        return bitmap
+
+    def count(self, without: (dict[str, object] | None) = None, **where: object) -> int:
+        return self.bitmap(without, **where).bit_count()
+
+    def find(self, without: (dict[str, object] | None) = None, **where: object) -> list[dict]:
+        """
+        Gets the records matching every condition of `where` and none of the conditions of `without`.
+
+        Returns:
+            list[dict]: The matching records, in the order of the export
+        """
+        return [self.records[i] for i in rows(self.bitmap(without, **where))]
+
+
+def rows(bitmap: int) -> Iterable[int]:
+    """
+    Gets the positions of the set bits of a bitmap, lowest first.
+    """
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+def parse_condition(condition: str) -> tuple[str, object]:
+    """
+    Parses a condition given on the command line as `FIELD=VALUE[,VALUE...]`.
+    Values are numbers, ranges of numbers like `0-3`, `true`/`false` or names
+    as found in the export, e.g. `level=0-3` or `classes=Wizard,Sorcerer`.
+
+    Returns:
+        tuple: The field and the list of values
+    """
+    name, separator, text = condition.partition("=")
+    if not separator or not name or not text:
+        raise argparse.ArgumentTypeError(f"invalid condition: {condition}, expected FIELD=VALUE")
+    values = []
+    for value in text.split(","):
+        if value in ("true", "false"):
+            values.append(value == "true")
+        elif re.fullmatch(r'-?\d+', value):
+            values.append(int(value))
+        elif bounds := re.fullmatch(r'(\d+)-(\d+)', value):
+            values.extend(range(int(bounds[1]), int(bounds[2]) + 1))
+        else:
+            values.append(value)
+    return name, values
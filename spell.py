@@ -1,12 +1,18 @@
-from dataclasses import InitVar, dataclass, field
+from dataclasses import InitVar, dataclass, field, fields
 from enum import Enum
 import json
 import re
+import sys
+from typing import Callable
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup, PageElement
-import requests
+from bs4 import Tag
 
+from fetcher import DEFAULT_FETCHER, Fetcher
+from metrics import profiled, timed
+from page_markdown import to_markdown
+from page_parser import parse_page, release_page, text_format
+import parse_cache
 from utils import BASE_URL, feets_to_units, sanitize_strings
 
 
@@ -70,11 +76,14 @@ LEVELS_MAP = {
     "8th level": 8,
     "9th level": 9
 }
+SPELL_DETAILS_STARTING_TEXT = "Casting Time:"
 UPCAST_STARTING_TEXT = "At Higher Levels"
 SPELL_CLASS_STARTING_TEXT = "Spell Lists"
+# bump when `_parse_html` changes what it gets from the page, it invalidates the parse cache
+PARSE_VERSION = 2
 
 
-@dataclass
+@dataclass(slots=True)
 class Spell:
     spell: InitVar[dict | None] = None
 
@@ -97,13 +106,16 @@ class Spell:
     has_upcast: bool = False
     upcast: str = ""
 
-    components: list[ComponentTypes] = field(default_factory=list)
+    components: tuple[ComponentTypes, ...] = ()
     component_material: str = ""
     classes: list[ClassTypes] = field(default_factory=list)
 
     url: str = ""
 
-    def __post_init__(self, spell: dict = None):
+    fetcher: InitVar[Fetcher | None] = None
+    html: InitVar[str | None] = None
+
+    def __post_init__(self, spell: dict = None, fetcher: Fetcher = None, html: str = None):
         if spell is None:
             return
 
@@ -118,46 +130,21 @@ class Spell:
         # 'URL': '',
         # 'category': ''
         # }
-        name = spell["Spell Name"]
-        school = spell["School"]
-        cast_time = spell["Casting Time"]
-        spell_range = spell["Range"]
-        duration = spell["Duration"]
-        components = spell["Components"]
-        level = spell["category"]
-        url = spell["URL"]
-
-        spell_name = Spell._parse_spell_name(name)
-        self.name = spell_name
-
-        school = school.strip().lower().split(" ")[0]
-        self.school = school
-
-        cast_type, cast_time_time, is_ritual = Spell._parse_cast_time(
-            cast_time)
-        self.cast_type, self.cast_time, self.is_ritual = cast_type, cast_time_time, is_ritual
+        for name, value in SPELL_ROW_PARSER.parse(spell).items():
+            setattr(self, name, value)
 
-        spell_range_type, spell_range_range = Spell._parse_spell_range(
-            spell_range)
-        self.range_type, self.spell_range = spell_range_type, spell_range_range
+        self.search_spell(fetcher, html)
 
-        duration, is_concentration = Spell._parse_duration(duration)
-        self.duration, self.is_concentration = duration, is_concentration
-
-        component_types = Spell._parse_components(components)
-        self.components = component_types
-
-        level = Spell._parse_level(level)
-        self.level = level
-
-        self.url = urljoin(BASE_URL, url)
+    def to_json(self) -> dict:
+        """
+        Gets the fields of the spell, with the enums as they are.
 
-        try:
-            self.search_spell()
-        except Exception as e:
-            print(f'Could not find spell {spell.name}')
-            print(e)
+        Returns:
+            dict: The fields of the spell by name.
+        """
+        return {spell_field.name: getattr(self, spell_field.name) for spell_field in fields(self)}
 
+    @timed("serialize")
     def to_json_str(self) -> str:
         """
         Converts the object to a JSON string representation.
@@ -167,7 +154,7 @@ class Spell:
         Returns:
             str: A string representing the object in JSON format.
         """
-        return json.dumps(self.__dict__, default=lambda o: o.toJSON(), ensure_ascii=False)
+        return json.dumps(self.to_json(), default=lambda o: o.toJSON(), ensure_ascii=False)
 
     @staticmethod
     def _parse_spell_name(spell_name_unsanitized: str) -> str:
@@ -187,6 +174,19 @@ class Spell:
                 spell_name = spell_name[:spell_name_split]
         return spell_name
 
+    @staticmethod
+    def _parse_school(school_unsanitized: str) -> str:
+        """
+        Parses the school from a given unsanitized string, dropping anything after the first word.
+
+        Parameters:
+            school_unsanitized (str): The unsanitized school string.
+
+        Returns:
+            str: The school in lower case.
+        """
+        return school_unsanitized.strip().lower().split(" ")[0]
+
     @staticmethod
     def _parse_cast_time(cast_time_unsanitized: str) -> tuple[CastType, int, bool]:
         """
@@ -327,130 +327,281 @@ class Spell:
             return -1
         return LEVELS_MAP[level]
 
-    def search_spell(self):
+    def search_spell(self, fetcher: Fetcher = None, html: str = None):
         """
         Perform a spell search for the given `Spell` object.
 
         Parameters:
             self: The `Spell` object to search for.
+            fetcher (Fetcher): The fetcher used to request the page, defaults to `DEFAULT_FETCHER`.
+            html (str): The already downloaded page, if given the page is parsed without any request.
+
+        Raises:
+            LookupError: Raises an error if the page can't be downloaded.
 
         Returns:
             None
         """
-        response = requests.get(self.url)
-        if response.status_code != 200:
-            raise LookupError(f'Could not find {
-                              self.name} from the following URL: {self.url}')
+        if html is None:
+            response = (fetcher or DEFAULT_FETCHER).get(self.url)
+            if response.status_code != 200:
+                raise LookupError(f'Could not find {
+                                  self.name} from the following URL: {self.url}')
+            html = response.text
+
+        # the material is only looked for when the index row lists it
+        has_material = ComponentTypes.Material in self.components
+        key, cached = parse_cache.lookup("Spell", PARSE_VERSION, html, has_material)
+        if cached is not None:
+            self.description, self.has_upcast, self.upcast, self.component_material = (
+                cached["description"], cached["has_upcast"], cached["upcast"], cached["component_material"])
+            self.classes = [ClassTypes[name] for name in cached["classes"]]
+            return
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        paragraphs = soup.find(id="page-content")
-        link_paragraphs = paragraphs.find_all('a')
-        for link in link_paragraphs:
-            link.replace_with(link.text)
+        self._parse_html(html)
+        parse_cache.store("Spell", PARSE_VERSION, key, {
+            "description": self.description,
+            "has_upcast": self.has_upcast,
+            "upcast": self.upcast,
+            "component_material": self.component_material,
+            "classes": [spell_class.name for spell_class in self.classes],
+        })
+
+    @profiled
+    @timed("parse")
+    def _parse_html(self, html: str):
+        """
+        Parse the page of the spell and set the fields found on it.
 
-        paragraphs = list(paragraphs.children)
+        Parameters:
+            self: The `Spell` object to set the fields for.
+            html (str): The page of the spell.
 
-        self._set_components(paragraphs)
+        Raises:
+            LookupError: Raises an error if the page has no block of spell details.
 
-        self._set_description_upcast_classes(paragraphs)
+        Returns:
+            None
+        """
+        page = parse_page(html)
+        try:
+            self._set_page_fields(page)
+        finally:
+            release_page(page)
 
-    def _set_components(self, paragraphs: list[PageElement]):
+    @timed("spell._set_page_fields")
+    def _set_page_fields(self, page: Tag):
         """
-        Set the components of a spell based on the provided spell object and paragraphs.
+        Set the component material, description, upcast and classes in a single pass over the children of
+        `#page-content`, which are laid out as:
+
+            <p>Source: ...</p>
+            <p><em>1st-level evocation</em></p>
+            <p><strong>Casting Time:</strong> ...<strong>Components:</strong> ...</p>   the details
+            <p>...</p> <ul>...</ul> ...                                                  the description
+            <p><strong><em>At Higher Levels.</em></strong> ...</p>                      the upcast, if any
+            <p><strong><em>Spell Lists.</em></strong> ...</p>                           the classes
+
+        The sections are told apart by their text, not by their position, so an extra
+        paragraph in the header or a missing upcast doesn't shift the others.
 
         Parameters:
-            self: The `Spell` object to set the components for.
-            paragraphs (list): A list of paragraphs containing the spell details.
+            self: The `Spell` object to set the fields for.
+            page (Tag): The `#page-content` element of the page.
+
+        Raises:
+            LookupError: Raises an error if the page has no block of spell details.
 
         Returns:
             None
         """
+        details = None
+        description = []
+        in_sections = False
+        for child in page.children:
+            if not isinstance(child, Tag):
+                # the text between the elements of the description is part of it
+                if details is not None and not in_sections and (description or not child.isspace()):
+                    description.append(child)
+                continue
+            text = child.get_text()
+            if details is None:
+                if SPELL_DETAILS_STARTING_TEXT in text:
+                    details = text
+                continue
+            if not in_sections:
+                if UPCAST_STARTING_TEXT not in text and SPELL_CLASS_STARTING_TEXT not in text:
+                    # only the description is exported as html, the links are dropped from it
+                    for link in child.find_all('a'):
+                        link.replace_with(link.text)
+                    description.append(child)
+                    continue
+                in_sections = True
+                if text.strip().startswith(UPCAST_STARTING_TEXT):
+                    self._set_upcast(text)
+            if text.startswith(SPELL_CLASS_STARTING_TEXT):
+                self._set_classes(text)
+
+        if details is None:
+            raise LookupError(f'No spell details found on the page of {self.name}')
         if ComponentTypes.Material in self.components:
-            spell_types = paragraphs[7].text
-            components_start = spell_types.find("Components: ")
-            components_end = spell_types.find("\n", components_start + 1)
-            components = spell_types[components_start + 1:components_end]
-            components = components[components.rfind("("):].strip("()")
-            self.component_material = sanitize_strings(components)
+            self._set_component_material(details)
+        if text_format() == "markdown":
+            self.description = sanitize_strings(to_markdown(description), keep_newlines=True).strip()
+        else:
+            self.description = sanitize_strings("".join(map(str, description)))
 
-    def _set_description_upcast_classes(self, paragraphs: list[PageElement]):
+    def _set_component_material(self, details: str):
         """
-        Set the description of a given spell and upcast it if necessary.
+        Set the material of the components from the text of the spell details.
 
         Parameters:
-            self: The `Spell` object to set the description and upcast for.
-            paragraphs (list): A list of paragraphs containing the description and upcast information.
+            self: The `Spell` object to set the component material for.
+            details (str): The text of the details, with a line like "Components: V, S, M (a pinch of sulfur)".
 
         Returns:
             None
         """
+        components_start = details.find("Components: ")
+        components_end = details.find("\n", components_start + 1)
+        components = details[components_start + 1:components_end]
+        components = components[components.rfind("("):].strip("()")
+        self.component_material = sanitize_strings(components)
 
-        end_description = (
-            UPCAST_STARTING_TEXT,
-            SPELL_CLASS_STARTING_TEXT
-        )
-        for i in range(9, len(paragraphs)):
-            flag = False
-            for end_str in end_description:
-                if end_str in str(paragraphs[i]):
-                    flag = True
-                    break
-            if flag:
-                break
-
-        description = paragraphs[9:i]
-        self.description = "".join([sanitize_strings(str(p))
-                                    for p in description])
-
-        self._set_upcast(paragraphs[i:])
-
-        self._set_classes(paragraphs[i:])
-
-    def _set_upcast(self, paragraphs: list[PageElement]):
+    def _set_upcast(self, text: str):
         """
-        Set up the upcast property of a given spell if it has upcast ability.
+        Set up the upcast property of a given spell from the text of its "At Higher Levels" section.
 
         Parameters:
             self: The `Spell` object to set the upcast for.
-            paragraphs (list): The list of paragraphs STARTING AT THE UPCAST DESCRIPTION
+            text (str): The text of the section.
 
         Returns:
             None
         """
-        if paragraphs[0].text.strip().startswith(UPCAST_STARTING_TEXT):
-            upcast = paragraphs[0].text.strip(
-                UPCAST_STARTING_TEXT).strip().lstrip(".").lstrip(":")
-            self.upcast = upcast
-            self.has_upcast = True
+        upcast = text.strip().strip(UPCAST_STARTING_TEXT).strip().lstrip(".").lstrip(":")
+        self.upcast = upcast
+        self.has_upcast = True
 
-    def _set_classes(self, paragraphs: list[PageElement]):
+    def _set_classes(self, text: str):
         """
-        Set the classes of a given spell based on the paragraphs provided.
+        Set the classes of a given spell from the text of its "Spell Lists" section.
 
-        This function iterates over each paragraph in the provided list of paragraphs. If a paragraph's text starts with
-        the specified starting text for spell classes, it extracts the class names from the paragraph's text and adds them
-        to the spell's classes attribute. The class names are expected to be comma-separated and any optional text is
-        removed before adding the class names to the spell's classes attribute.
+        The class names are expected to be comma-separated and any optional text after a class name, e.g.
+        "Wizard (Optional)", is removed before adding the class to the spell's classes attribute.
 
         Parameters:
             self: The `Spell` object to set the classes for.
-            paragraphs (list): A list of PageElement objects representing the paragraphs to search for class information.
+            text (str): The text of the section.
 
         Returns:
             None
         """
-        for paragraph in paragraphs:
-            if paragraph.text.startswith(SPELL_CLASS_STARTING_TEXT):
-                classes = paragraph.text.replace(
-                    SPELL_CLASS_STARTING_TEXT, "").strip().lstrip(".").lstrip(":")
-                for spell_class in classes.split(","):
-                    spell_class = spell_class.strip()
-                    has_space = spell_class.find(" ")
-                    if has_space != -1:
-                        spell_class = spell_class[:spell_class.find(" ")]
-                    try:
-                        self.classes.append(
-                            ClassTypes[spell_class.strip().title()])
-                    except KeyError:
-                        print(f"Unknown class for spell: {
-                              self.name}\n\nwith class: {spell_class}")
+        classes = text.replace(SPELL_CLASS_STARTING_TEXT, "").strip().lstrip(".").lstrip(":")
+        for spell_class in classes.split(","):
+            spell_class = spell_class.strip()
+            has_space = spell_class.find(" ")
+            if has_space != -1:
+                spell_class = spell_class[:spell_class.find(" ")]
+            try:
+                self.classes.append(
+                    ClassTypes[spell_class.strip().title()])
+            except KeyError:
+                print(f"Unknown class for spell: {
+                      self.name}\n\nwith class: {spell_class}")
+
+
+# index column -> (the fields it sets, the parser of the column, whether the values repeat across spells)
+SPELL_ROW_COLUMNS = {
+    "Spell Name": (("name",), lambda name: (Spell._parse_spell_name(name),), False),
+    "School": (("school",), lambda school: (Spell._parse_school(school),), True),
+    "Casting Time": (("cast_type", "cast_time", "is_ritual"), Spell._parse_cast_time, True),
+    "Range": (("range_type", "spell_range"), Spell._parse_spell_range, True),
+    "Duration": (("duration", "is_concentration"), Spell._parse_duration, True),
+    "Components": (("components",), lambda components: (tuple(Spell._parse_components(components)),), True),
+    "category": (("level",), lambda level: (Spell._parse_level(level),), True),
+    "URL": (("url",), lambda url: (urljoin(BASE_URL, url),), False),
+}
+
+
+class SpellRowParser:
+    """
+    Parses the index rows of spells into `Spell` fields, following `SPELL_ROW_COLUMNS`.
+
+    Columns like "Casting Time" or "Components" only have a few distinct values
+    across the whole catalogue, so each distinct value is parsed once and the
+    result, with its strings interned and its component types in a tuple, is
+    shared by every spell that has it.
+    """
+
+    def __init__(self) -> None:
+        self._parsed: dict[tuple[str, str], tuple] = {}
+
+    def parse(self, row: dict[str, str]) -> dict[str, object]:
+        """
+        Parses one index row.
+
+        Parameters:
+            row (dict): A row from `get_wiki_table`.
+
+        Returns:
+            dict: The `Spell` fields found in the row.
+        """
+        fields = {}
+        for column, (names, parse, repeats) in SPELL_ROW_COLUMNS.items():
+            value = row[column]
+            if not repeats:
+                fields.update(zip(names, parse(value)))
+                continue
+            parsed = self._parsed.get((column, value))
+            if parsed is None:
+                parsed = self._parsed[(column, value)] = self._parse_value(parse, value)
+            fields.update(zip(names, parsed))
+        return fields
+
+    def parse_rows(self, rows: list[dict[str, str]]) -> list[dict[str, object]]:
+        """
+        Parses every index row of the table at once. The distinct values of every
+        repeating column are collected across all the rows and each is parsed
+        once, before the fields of the rows are put together from them.
+
+        Parameters:
+            rows (list): The rows from `get_wiki_table`.
+
+        Returns:
+            list: The `Spell` fields of every row, in the same order.
+        """
+        for column, (_, parse, repeats) in SPELL_ROW_COLUMNS.items():
+            if not repeats:
+                continue
+            for value in {row[column] for row in rows}:
+                if (column, value) not in self._parsed:
+                    self._parsed[(column, value)] = self._parse_value(parse, value)
+        return [self.parse(row) for row in rows]
+
+    @staticmethod
+    def _parse_value(parse: Callable[[str], tuple], value: str) -> tuple:
+        return tuple(sys.intern(v) if isinstance(v, str) else v for v in parse(value))
+
+
+SPELL_ROW_PARSER = SpellRowParser()
+
+
+def rederive_spell_fields(records: list[dict], rows: list[dict[str, str]]) -> list[dict]:
+    """
+    Recomputes the fields that come from the index rows in exported spells, without
+    fetching any page, e.g. after a fix to one of the `Spell._parse_*` methods.
+
+    Parameters:
+        records (list): The spells of an export, as loaded from JSON.
+        rows (list): The index rows the spells were scraped from, e.g. from `spells.json`.
+
+    Returns:
+        list: The same records, updated in place.
+    """
+    rows_by_url = {urljoin(BASE_URL, row["URL"]): row for row in rows}
+    matched = [(record, rows_by_url[record["url"]]) for record in records if record["url"] in rows_by_url]
+    parsed = SpellRowParser().parse_rows([row for _, row in matched])
+    for (record, _), fields in zip(matched, parsed):
+        record.update(json.loads(json.dumps(fields, default=lambda o: o.toJSON())))
+    return records
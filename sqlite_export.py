@@ -0,0 +1,200 @@
+import json
+import sqlite3
+import threading
+
+DEFAULT_BATCH_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spells (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    description TEXT,
+    level INTEGER,
+    school TEXT,
+    duration TEXT,
+    is_concentration INTEGER,
+    cast_type TEXT,
+    cast_time INTEGER,
+    is_ritual INTEGER,
+    range_type TEXT,
+    spell_range TEXT,
+    has_upcast INTEGER,
+    upcast TEXT,
+    component_material TEXT
+);
+CREATE TABLE IF NOT EXISTS spell_classes (
+    spell_id INTEGER NOT NULL REFERENCES spells (id) ON DELETE CASCADE,
+    class TEXT NOT NULL,
+    PRIMARY KEY (spell_id, class)
+);
+CREATE TABLE IF NOT EXISTS spell_components (
+    spell_id INTEGER NOT NULL REFERENCES spells (id) ON DELETE CASCADE,
+    component TEXT NOT NULL,
+    PRIMARY KEY (spell_id, component)
+);
+CREATE TABLE IF NOT EXISTS feats (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    description TEXT,
+    prerequisite TEXT,
+    has_prerequisite INTEGER
+);
+CREATE TABLE IF NOT EXISTS magic_items (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    rarity TEXT,
+    type TEXT,
+    source TEXT,
+    attuned INTEGER,
+    text TEXT
+);
+
+CREATE INDEX IF NOT EXISTS spells_level ON spells (level);
+CREATE INDEX IF NOT EXISTS spells_school ON spells (school);
+CREATE INDEX IF NOT EXISTS spells_cast_type ON spells (cast_type);
+CREATE INDEX IF NOT EXISTS spells_range_type ON spells (range_type);
+CREATE INDEX IF NOT EXISTS spells_is_ritual ON spells (is_ritual);
+CREATE INDEX IF NOT EXISTS spells_is_concentration ON spells (is_concentration);
+CREATE INDEX IF NOT EXISTS spell_classes_class ON spell_classes (class, spell_id);
+CREATE INDEX IF NOT EXISTS spell_components_component ON spell_components (component, spell_id);
+CREATE INDEX IF NOT EXISTS feats_has_prerequisite ON feats (has_prerequisite);
+CREATE INDEX IF NOT EXISTS magic_items_rarity ON magic_items (rarity);
+CREATE INDEX IF NOT EXISTS magic_items_type ON magic_items (type);
+CREATE INDEX IF NOT EXISTS magic_items_source ON magic_items (source);
+CREATE INDEX IF NOT EXISTS magic_items_attuned ON magic_items (attuned);
+"""
+
+# record type -> (table, columns, multi valued fields -> (join table, column), columns of the full text index)
+TABLES = {
+    "Spell": ("spells",
+              ("name", "description", "level", "school", "duration", "is_concentration", "cast_type",
+               "cast_time", "is_ritual", "range_type", "spell_range", "has_upcast", "upcast",
+               "component_material"),
+              {"classes": ("spell_classes", "class"), "components": ("spell_components", "component")},
+              ("name", "description", "upcast")),
+    "Feats": ("feats",
+              ("name", "description", "prerequisite", "has_prerequisite"),
+              {},
+              ("name", "description", "prerequisite")),
+    "MagicItem": ("magic_items",
+                  ("name", "rarity", "type", "source", "attuned", "text"),
+                  {},
+                  ("name", "text")),
+}
+
+
+def _full_text_schema(table: str, columns: tuple[str, ...]) -> str:
+    """
+    Builds an FTS5 index over columns of a table, kept up to date by triggers.
+    """
+    names = ", ".join(columns)
+    new = ", ".join(f'new.{column}' for column in columns)
+    old = ", ".join(f'old.{column}' for column in columns)
+    return f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5 ({names}, content='{table}', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts (rowid, {names}) VALUES (new.id, {new});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old});
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table} BEGIN
+    INSERT INTO {table}_fts ({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old});
+    INSERT INTO {table}_fts (rowid, {names}) VALUES (new.id, {new});
+END;
+"""
+
+
+class SQLiteExport:
+    """
+    Writes the scraped records of every content type into one SQLite database,
+    with join tables for the classes and components of spells, indexes on the
+    commonly filtered columns and an FTS5 index over the text of every table,
+    e.g. `SELECT name FROM spells_fts WHERE spells_fts MATCH 'fire'`.
+
+    Records are upserted by url, so the database can be written again by later
+    scrapes, and they are committed `batch_size` at a time. Once a scrape is
+    done, `prune` deletes the records that aren't in its export anymore.
+    Scrapers running at the same time can share one export.
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self._pending: list[tuple[str, dict]] = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(SCHEMA + "".join(
+            _full_text_schema(table, full_text) for table, _, _, full_text in TABLES.values()))
+
+    def write(self, record_type: str, record: (str | dict)) -> None:
+        """
+        Queues a record, the queued records are written once there are `batch_size` of them.
+
+        Args:
+            record_type: The class the record was made with, a key of `TABLES`
+            record: The record, as a JSON string or as loaded from one
+        """
+        if isinstance(record, str):
+            record = json.loads(record)
+        with self._lock:
+            self._pending.append((record_type, record))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        """
+        Writes the queued records in a single transaction.
+        """
+        with self._lock:
+            self._flush()
+
+    def prune(self, record_type: str, urls: set[str]) -> int:
+        """
+        Writes the queued records, then deletes the records of a type whose url
+        isn't one of `urls`, e.g. the ones that dropped out of the index. Their
+        classes, components and full text entries go with them.
+
+        Args:
+            record_type: The class the records were made with, a key of `TABLES`
+            urls: The urls of every record the type has now
+
+        Returns:
+            int: The number of deleted records
+        """
+        table = TABLES[record_type][0]
+        with self._lock:
+            self._flush()
+            stale = [(url,) for (url,) in self._db.execute(f"SELECT url FROM {table}") if url not in urls]
+            with self._db:
+                self._db.executemany(f"DELETE FROM {table} WHERE url = ?", stale)
+        return len(stale)
+
+    def _flush(self) -> None:
+        with self._db:
+            for record_type, record in self._pending:
+                self._upsert(record_type, record)
+        self._pending.clear()
+
+    def _upsert(self, record_type: str, record: dict) -> None:
+        table, columns, joins, _ = TABLES[record_type]
+        values = [record["url"]] + [record[column] for column in columns]
+        assignments = ", ".join(f'{column} = excluded.{column}' for column in columns)
+        (record_id,) = self._db.execute(
+            f"""INSERT INTO {table} (url, {', '.join(columns)}) VALUES ({', '.join('?' * len(values))})
+                ON CONFLICT (url) DO UPDATE SET {assignments} RETURNING id""", values).fetchone()
+        for field, (join_table, join_column) in joins.items():
+            self._db.execute(f"DELETE FROM {join_table} WHERE spell_id = ?", (record_id,))
+            self._db.executemany(
+                f"INSERT INTO {join_table} (spell_id, {join_column}) VALUES (?, ?)",
+                [(record_id, value) for value in dict.fromkeys(record[field])])
+
+    def close(self) -> None:
+        self.flush()
+        self._db.execute("PRAGMA optimize")
+        self._db.close()
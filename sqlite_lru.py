@@ -0,0 +1,129 @@
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+
+
+class SQLiteLRU:
+    """
+    A table of entries in a SQLite file, keyed by one column, that evicts its
+    least recently used entries once their sizes add up to more than
+    `max_size` bytes.
+
+    The table has the `key` column, the other `columns` as SQL definitions,
+    e.g. "body BLOB NOT NULL", the `size` of every entry and the time it was
+    last `accessed`. The total size is kept in `lru_sizes` by triggers on the
+    table, so storing an entry doesn't sum the whole table and every process
+    writing the file keeps the total right.
+    """
+
+    def __init__(self, path: str, table: str, key: str, columns: tuple[str, ...], max_size: int) -> None:
+        self.path = path
+        self.table = table
+        self.key = key
+        self.max_size = max_size
+        self._names = [key] + [column.split()[0] for column in columns] + ["size", "accessed"]
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        # a lost entry is only fetched or parsed again, no need to sync every commit
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        with self._transaction():
+            self._db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {key} TEXT PRIMARY KEY,
+                    {", ".join(columns)},
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lru_sizes (name TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+            # a file written before the totals were kept is summed once
+            self._db.execute(f"INSERT OR IGNORE INTO lru_sizes SELECT ?, COALESCE(SUM(size), 0) FROM {table}",
+                             (table,))
+            for name, event, change in (("inserted", "AFTER INSERT", "+ new.size"),
+                                        ("deleted", "AFTER DELETE", "- old.size"),
+                                        ("resized", "AFTER UPDATE OF size", "+ new.size - old.size")):
+                self._db.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_{name} {event} ON {table} BEGIN
+                        UPDATE lru_sizes SET size = size {change} WHERE name = '{table}';
+                    END""")
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs the block in a transaction holding the write lock of the file from the start.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def get(self, key: str, columns: str, condition: str = "TRUE", parameters: tuple = ()) -> (tuple | None):
+        """
+        Looks up an entry and marks it as recently used.
+
+        Args:
+            key: The key of the entry
+            columns: The comma separated columns to return
+            condition: What else the entry has to match, with `parameters` for its placeholders
+
+        Returns:
+            tuple | None: The columns of the entry, or None if there is no such entry
+        """
+        with self._lock:
+            return self._db.execute(
+                f"UPDATE {self.table} SET accessed = ? WHERE {self.key} = ? AND ({condition}) RETURNING {columns}",
+                (time.time(), key, *parameters)).fetchone()
+
+    def put(self, key: str, values: tuple, size: int) -> None:
+        """
+        Stores an entry in place of the one with the same key, evicting the least
+        recently used entries if the table is full. An entry larger than the
+        whole table isn't stored.
+
+        Args:
+            key: The key of the entry
+            values: The values of the other columns, in order
+            size: The bytes the entry takes up
+        """
+        if size > self.max_size:
+            return
+        updates = ", ".join(f"{name} = excluded.{name}" for name in self._names[1:])
+        with self._lock, self._transaction():
+            self._db.execute(
+                f"INSERT INTO {self.table} ({', '.join(self._names)}) VALUES ({', '.join('?' for _ in self._names)}) "
+                f"ON CONFLICT ({self.key}) DO UPDATE SET {updates}",
+                (key, *values, size, time.time()))
+            self._evict()
+
+    def delete(self, condition: str, parameters: tuple = ()) -> None:
+        """
+        Deletes the entries matching the condition.
+        """
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self.table} WHERE {condition}", parameters)
+
+    def _evict(self) -> None:
+        """
+        Deletes the least recently used entries until the table fits in `max_size`.
+        """
+        total = self._db.execute("SELECT size FROM lru_sizes WHERE name = ?", (self.table,)).fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for key, size in self._db.execute(f"SELECT {self.key}, size FROM {self.table} ORDER BY accessed"):
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany(f"DELETE FROM {self.table} WHERE {self.key} = ?", evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
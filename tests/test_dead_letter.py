@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+
+from dead_letter import DeadLetters
+from incremental import row_url
+
+
+def row(name: str) -> dict[str, str]:
+    return {"Feat Name": name, "URL": f"/feat:{name.lower()}"}
+
+
+ALERT = row_url(row("Alert"))
+GRAPPLER = row_url(row("Grappler"))
+
+
+class DeadLettersTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "exported_feats.failed.jsonl")
+
+    def lines(self) -> int:
+        with open(self.path, encoding="utf-8") as dead_letter_file:
+            return len(dead_letter_file.readlines())
+
+    def test_failures_are_appended_and_compacted_on_finish(self):
+        dead_letters = DeadLetters(self.path)
+        dead_letters.add(row("Alert"), LookupError("404"), 0)
+        dead_letters.add(row("Grappler"), LookupError("503"), 1)
+        dead_letters.add(row("Alert"), LookupError("503"), 0)
+        dead_letters.resolve(GRAPPLER)
+        self.assertEqual(self.lines(), 3)
+        # a run that stops here still has every failure in the file, the last one of a url counts
+        self.assertEqual(DeadLetters(self.path).entries[ALERT]["attempts"], 2)
+
+        dead_letters.finish()
+        self.assertEqual(self.lines(), 1)
+        self.assertEqual(list(DeadLetters(self.path).entries), [ALERT])
+
+    def test_finish_drops_rows_that_left_the_index(self):
+        dead_letters = DeadLetters(self.path)
+        dead_letters.add(row("Alert"), LookupError("404"), 0)
+        dead_letters.add(row("Grappler"), LookupError("404"), 1)
+        dead_letters.finish({GRAPPLER: 0})
+        self.assertEqual(list(DeadLetters(self.path).entries), [GRAPPLER])
+
+        dead_letters = DeadLetters(self.path)
+        dead_letters.finish({})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_appends_after_a_torn_line(self):
+        dead_letters = DeadLetters(self.path)
+        dead_letters.add(row("Alert"), LookupError("404"), 0)
+        dead_letters.finish()
+        with open(self.path, "a", encoding="utf-8") as dead_letter_file:
+            dead_letter_file.write('{"url": "/feat:gra')
+
+        dead_letters = DeadLetters(self.path)
+        dead_letters.add(row("Grappler"), LookupError("404"), 1)
+        self.assertEqual(list(DeadLetters(self.path).entries), [ALERT, GRAPPLER])
@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from fetcher import AIMDController
+
+
+def response(status_code: int) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+class AIMDControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch("time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.controller = AIMDController(8, rate=1, max_rate=20)
+
+    def release(self, latency: float, status_code: int = 200) -> None:
+        # every request takes its latency, one after the other
+        self.now += latency
+        self.controller.release(latency, response(status_code))
+
+    def test_grows_while_healthy(self):
+        for _ in range(200):
+            self.release(0.05)
+        self.assertEqual(self.controller.concurrency, 8)
+        self.assertEqual(self.controller.rate, 20)
+
+    def test_spike_decreases(self):
+        for _ in range(200):
+            self.release(0.05)
+        self.release(1.0)
+        self.assertEqual(self.controller.concurrency, 4)
+        self.assertEqual(self.controller.rate, 10)
+
+    def test_learns_a_lasting_slowdown(self):
+        for _ in range(50):
+            self.release(0.05)
+        for _ in range(2000):
+            self.release(0.2)
+        self.assertAlmostEqual(self.controller.latency, 0.2, places=3)
+        self.assertEqual(self.controller.concurrency, 8)
+        self.assertEqual(self.controller.rate, 20)
+
+    def test_fast_revalidations_are_not_a_baseline(self):
+        # cached pages answered with a fast 304 between full downloads
+        for i in range(2000):
+            self.release(0.01 if i % 2 else 0.2, 304 if i % 2 else 200)
+        self.assertEqual(self.controller.concurrency, 8)
+        self.assertEqual(self.controller.rate, 20)
+
+    def test_throttled_decreases_and_pauses(self):
+        for _ in range(200):
+            self.release(0.05)
+        throttled = response(429)
+        throttled.headers["Retry-After"] = "5"
+        self.now += 0.05
+        self.controller.release(0.05, throttled)
+        self.assertEqual(self.controller.concurrency, 4)
+        self.assertGreaterEqual(self.controller._paused_until, self.now + 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
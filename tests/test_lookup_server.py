@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from lookup_server import LookupService
+
+# stands in for main.py: writes the feats export given as the argument to --output-dir and exits with the first argument,
+# the failed rows are kept with `failed`
+SCRAPER = """
+import json, os, sys
+directory = sys.argv[sys.argv.index("--output-dir") + 1]
+with open(os.path.join(directory, "exported_feats.json"), "w") as export_file:
+    export_file.write('[{"name": "Grappler", "url": "/feat:grappler", "has_prerequisite": true}')
+    if sys.argv[1] == "0":
+        export_file.write("]")
+if "failed" not in sys.argv and os.path.exists(os.path.join(directory, "exported_feats.failed.jsonl")):
+    os.remove(os.path.join(directory, "exported_feats.failed.jsonl"))
+sys.exit(int(sys.argv[1]))
+"""
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.export = os.path.join(self.directory, "exported_feats.json")
+        with open(self.export, "w", encoding="utf-8") as export_file:
+            json.dump([{"name": "Alert", "url": "/feat:alert", "has_prerequisite": False}], export_file)
+        self.failed = os.path.join(self.directory, "exported_feats.failed.jsonl")
+        with open(self.failed, "w", encoding="utf-8") as failed_file:
+            failed_file.write(json.dumps({"url": "/feat:grappler"}) + "\n")
+        scraper = os.path.join(self.directory, "scraper.py")
+        with open(scraper, "w", encoding="utf-8") as scraper_file:
+            scraper_file.write(SCRAPER)
+        patcher = mock.patch("lookup_server.MAIN", scraper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def service(self, exit_code: int, *argv: str) -> LookupService:
+        return LookupService(["feats"], scrape_argv=[str(exit_code), *argv], output_dir=self.directory)
+
+    def test_failed_scrape_keeps_the_exports(self):
+        service = self.service(1)
+        self.assertFalse(service.refresh())
+        with open(self.export, encoding="utf-8") as export_file:
+            self.assertEqual(json.load(export_file)[0]["name"], "Alert")
+        self.assertTrue(os.path.exists(self.failed))
+        self.assertEqual(list(service.snapshot.collections["feats"].by_name), ["alert"])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["exported_feats.failed.jsonl", "exported_feats.json", "scraper.py"])
+
+    def test_scrape_with_failed_rows_keeps_the_exports(self):
+        service = self.service(0, "failed")
+        self.assertFalse(service.refresh())
+        with open(self.export, encoding="utf-8") as export_file:
+            self.assertEqual(json.load(export_file)[0]["name"], "Alert")
+        self.assertIn("1 in exported_feats.failed.jsonl", service.status()["errors"]["refresh"])
+        self.assertEqual(list(service.snapshot.collections["feats"].by_name), ["alert"])
+
+    def test_scrape_replaces_the_exports(self):
+        service = self.service(0)
+        self.assertTrue(service.refresh())
+        with open(self.export, encoding="utf-8") as export_file:
+            self.assertEqual(json.load(export_file)[0]["name"], "Grappler")
+        self.assertFalse(os.path.exists(self.failed))
+        self.assertEqual(list(service.snapshot.collections["feats"].by_name), ["grappler"])
+        self.assertEqual(sorted(os.listdir(self.directory)), ["exported_feats.json", "scraper.py"])
+        self.assertNotIn("refresh", service.status()["errors"])
@@ -0,0 +1,54 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from urllib.parse import urljoin
+
+from export_writer import read_export
+import main
+from utils import BASE_URL
+
+ROWS = [
+    {"Spell Name": "Fire Bolt", "School": "Evocation", "Casting Time": "1 Action", "Range": "120 Feet",
+     "Duration": "Instantaneous", "Components": "V, S", "URL": "/spell:fire-bolt", "category": "Cantrip"},
+    {"Spell Name": "Alarm", "School": "Abjuration", "Casting Time": "1 Minute R", "Range": "30 Feet",
+     "Duration": "8 Hours", "Components": "V, S, M", "URL": "/spell:alarm", "category": "1st Level"},
+]
+
+
+class RederiveTest(unittest.TestCase):
+    def test_rederive_rewrites_the_index_fields(self):
+        for output_format in ("json", "jsonl"):
+            with self.subTest(output_format), tempfile.TemporaryDirectory() as directory:
+                with open(os.path.join(directory, "spells.json"), "w", encoding="utf-8") as dump_file:
+                    json.dump(ROWS, dump_file)
+                # exported with a broken parser: every spell is an hour long, the rest of the record is kept
+                path = os.path.join(directory, f"exported_spells.{output_format}")
+                records = [{"name": row["Spell Name"], "description": "<p>Text</p>", "duration": "1 hour",
+                            "level": -1, "url": urljoin(BASE_URL, row["URL"])} for row in ROWS]
+                with open(path, "w", encoding="utf-8") as export_file:
+                    if output_format == "json":
+                        json.dump(records, export_file)
+                    else:
+                        export_file.writelines(json.dumps(record) + "\n" for record in records)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    main.main(["--rederive", path])
+
+                fire_bolt, alarm = read_export(path)
+                self.assertEqual((fire_bolt["duration"], fire_bolt["level"], fire_bolt["components"]),
+                                 ("instantaneous", 0, ["Verbal", "Somatic"]))
+                self.assertEqual((alarm["duration"], alarm["level"], alarm["is_ritual"]), ("8 hours", 1, True))
+                self.assertEqual(alarm["description"], "<p>Text</p>")
+
+
+class ServeTest(unittest.TestCase):
+    def test_scrape_options_stop_at_the_command(self):
+        with mock.patch("lookup_server.LookupService") as service, mock.patch("lookup_server.LookupServer"), \
+                contextlib.redirect_stdout(io.StringIO()):
+            main.main(["-s", "--output-dir", "serve", "serve", "--port", "0"])
+        type_grabs, _, scrape_argv, _, output_dir = service.call_args.args
+        self.assertEqual((type_grabs, scrape_argv, output_dir), (["spells"], ["-s", "--output-dir", "serve"], "serve"))
@@ -0,0 +1,36 @@
+import unittest
+
+import requests
+
+from feats import Feats
+from fetcher import Fetcher
+from pipeline import Pipeline
+
+
+class NotFoundFetcher(Fetcher):
+    def __init__(self) -> None:
+        super().__init__(workers=2, rate=0)
+        self.requests = 0
+
+    def get(self, url: str) -> requests.Response:
+        self.requests += 1
+        response = requests.Response()
+        response.status_code = 404
+        response.url = url
+        return response
+
+
+class PipelineTest(unittest.TestCase):
+    def test_failed_page_is_fetched_once(self):
+        fetcher = NotFoundFetcher()
+        errors = []
+        rows = [{"Feat Name": "Alert", "URL": "/feat:alert"}]
+        records = list(Pipeline(Feats, fetcher, 1).run(rows, on_error=lambda row, e: errors.append(e)))
+        self.assertEqual(records, [None])
+        self.assertEqual(fetcher.requests, 1)
+        self.assertIsInstance(errors[0], LookupError)
+        self.assertIn("Alert", str(errors[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import json
+import os
+import tempfile
+import unittest
+
+from query import FEAT_FIELDS, QueryIndex
+
+
+class QueryIndexTest(unittest.TestCase):
+    def load(self, records: list[dict]) -> QueryIndex:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "exported.json")
+            with open(path, "w", encoding="utf-8") as export_file:
+                json.dump(records, export_file)
+            return QueryIndex.load(path)
+
+    def test_loads_feats(self):
+        index = self.load([
+            {"name": "Alert", "prerequisite": "", "has_prerequisite": False},
+            {"name": "Grappler", "prerequisite": "Strength 13", "has_prerequisite": True},
+        ])
+        self.assertEqual(tuple(index.bitmaps), FEAT_FIELDS)
+        self.assertEqual([record["name"] for record in index.find(has_prerequisite=True)], ["Grappler"])
+
+    def test_rejects_other_exports(self):
+        with self.assertRaises(ValueError):
+            self.load([{"name": "Alert"}])
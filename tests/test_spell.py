@@ -0,0 +1,38 @@
+import sys
+import unittest
+from unittest import mock
+
+from spell import SPELL_ROW_COLUMNS, ComponentTypes, SpellRowParser
+
+
+def row(name: str, casting_time: str = "1 Action", duration: str = "Concentration, up to 1 minute",
+        components: str = "V, S, M") -> dict[str, str]:
+    return {"Spell Name": name, "School": "Evocation", "Casting Time": casting_time, "Range": "60 Feet",
+            "Duration": duration, "Components": components, "URL": f"/spell:{name.lower()}", "category": "1st Level"}
+
+
+class SpellRowParserTest(unittest.TestCase):
+    def test_rows_share_parsed_values(self):
+        first, second, third = SpellRowParser().parse_rows([row("Fire Bolt"), row("Shield"), row("Sleep", components="V")])
+
+        self.assertEqual(first["components"],
+                         (ComponentTypes.Verbal, ComponentTypes.Somatic, ComponentTypes.Material))
+        self.assertIs(first["components"], second["components"])
+        self.assertEqual(third["components"], (ComponentTypes.Verbal,))
+        for name in ("school", "duration", "spell_range"):
+            self.assertIs(first[name], second[name])
+            self.assertIs(first[name], third[name])
+            self.assertIs(sys.intern(first[name]), first[name])
+
+    def test_distinct_values_are_parsed_once(self):
+        names, parse, repeats = SPELL_ROW_COLUMNS["Duration"]
+        parsed = []
+        counted = (names, lambda value: parsed.append(value) or parse(value), repeats)
+        rows = [row("Fire Bolt"), row("Shield", duration="1 Round"), row("Sleep"), row("Alarm", duration="1 Round")]
+        with mock.patch.dict(SPELL_ROW_COLUMNS, {"Duration": counted}):
+            SpellRowParser().parse_rows(rows)
+        self.assertEqual(sorted(parsed), ["1 Round", "Concentration, up to 1 minute"])
+
+    def test_parse_rows_matches_parse(self):
+        rows = [row("Fire Bolt"), row("Alarm", casting_time="1 Minute Ritual", duration="8 Hours")]
+        self.assertEqual(SpellRowParser().parse_rows(rows), [SpellRowParser().parse(spell_row) for spell_row in rows])
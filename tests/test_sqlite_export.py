@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from sqlite_export import SQLiteExport
+
+
+def spell(name: str) -> dict:
+    return {"url": f"http://dnd5e.wikidot.com/spell:{name.lower()}", "name": name,
+            "description": f"<p>{name} hurls a mote of fire.</p>", "level": 0, "school": "evocation",
+            "duration": "instantaneous", "is_concentration": False, "cast_type": "Action", "cast_time": 1,
+            "is_ritual": False, "range_type": "Units", "spell_range": "120 unit", "has_upcast": False,
+            "upcast": "", "component_material": "", "classes": ["Sorcerer", "Wizard"],
+            "components": ["Verbal", "Somatic"]}
+
+
+class SQLiteExportTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.export = SQLiteExport(os.path.join(directory.name, "catalogue.sqlite"))
+        self.addCleanup(self.export.close)
+
+    def count(self, query: str) -> int:
+        return self.export._db.execute(query).fetchone()[0]
+
+    def test_prune_deletes_records_missing_from_the_export(self):
+        fire_bolt, frostbite = spell("Firebolt"), spell("Frostbite")
+        self.export.write("Spell", fire_bolt)
+        self.export.write("Spell", frostbite)
+        self.export.flush()
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spells_fts WHERE spells_fts MATCH 'frostbite'"), 1)
+
+        self.assertEqual(self.export.prune("Spell", {fire_bolt["url"]}), 1)
+
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spells"), 1)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spell_classes"), 2)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spell_components"), 2)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spells_fts WHERE spells_fts MATCH 'frostbite'"), 0)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spells_fts WHERE spells_fts MATCH 'firebolt'"), 1)
+
+    def test_prune_writes_the_queued_records_first(self):
+        self.export.write("Spell", spell("Firebolt"))
+        self.assertEqual(self.export.prune("Spell", {spell("Firebolt")["url"]}), 0)
+        self.assertEqual(self.count("SELECT COUNT(*) FROM spells"), 1)
+        self.assertEqual(self.export.prune("Feats", set()), 0)
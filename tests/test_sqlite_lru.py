@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from sqlite_lru import SQLiteLRU
+
+
+class SQLiteLRUTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def open(self, max_size: int = 10) -> SQLiteLRU:
+        lru = SQLiteLRU(self.path, "entries", "key", ("value TEXT NOT NULL",), max_size)
+        self.addCleanup(lru.close)
+        return lru
+
+    def total(self) -> int:
+        with sqlite3.connect(self.path) as db:
+            return db.execute("SELECT size FROM lru_sizes WHERE name = 'entries'").fetchone()[0]
+
+    def test_evicts_least_recently_used(self):
+        lru = self.open()
+        lru.put("a", ("a",), 4)
+        lru.put("b", ("b",), 4)
+        self.assertEqual(lru.get("a", "value"), ("a",))
+        lru.put("c", ("c",), 4)
+        self.assertIsNone(lru.get("b", "value"))
+        self.assertEqual(lru.get("a", "value"), ("a",))
+        self.assertEqual(self.total(), 8)
+
+    def test_replace_and_delete_keep_the_total(self):
+        lru = self.open()
+        lru.put("a", ("a",), 4)
+        lru.put("a", ("aa",), 6)
+        lru.put("b", ("b",), 3)
+        self.assertEqual(self.total(), 9)
+        lru.delete("value = ?", ("b",))
+        self.assertEqual(self.total(), 6)
+
+    def test_condition(self):
+        lru = self.open()
+        lru.put("a", ("a",), 1)
+        self.assertIsNone(lru.get("a", "value", "value = ?", ("b",)))
+        self.assertEqual(lru.get("a", "value", "value = ?", ("a",)), ("a",))
+
+    def test_entry_larger_than_the_cache_is_not_stored(self):
+        lru = self.open()
+        lru.put("a", ("a",), 4)
+        lru.put("b", ("b",), 11)
+        self.assertIsNone(lru.get("b", "value"))
+        self.assertEqual(lru.get("a", "value"), ("a",))
+
+    def test_sums_a_file_without_a_total(self):
+        with sqlite3.connect(self.path) as db:
+            db.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                       "size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            db.execute("INSERT INTO entries VALUES ('a', 'a', 7, 0)")
+        lru = self.open()
+        self.assertEqual(self.total(), 7)
+        lru.put("b", ("b",), 5)
+        self.assertIsNone(lru.get("a", "value"))
+        self.assertEqual(self.total(), 5)
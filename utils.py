@@ -1,6 +1,8 @@
+import os
 import re
 
-BASE_URL = "http://dnd5e.wikidot.com"
+# can be pointed at a local copy of the site, e.g. the benchmark stand-in server
+BASE_URL = os.environ.get("DND_SCRAPER_BASE_URL", "http://dnd5e.wikidot.com")
 
 def feets_to_units(description: str) -> str:
     """
@@ -23,15 +25,19 @@ def feets_to_units(description: str) -> str:
     return description
 
 
-def sanitize_strings(paragraph: str):
+def sanitize_strings(paragraph: str, keep_newlines: bool = False):
     """
     Generate a sanitized version of the input paragraph by replacing newline characters with spaces,
     smart apostrophes with regular apostrophes, and en dashes with hyphens.
 
     Args:
         paragraph (str): The input paragraph to be sanitized.
+        keep_newlines (bool): Keep the newlines, e.g. of markdown.
 
     Returns: 
         The sanitized version of the input paragraph.
     """
-    return paragraph.replace("\n", " ").replace("\u2019", "'").replace("\u2013", "-")
\ No newline at end of file
+    # chained replaces beat str.translate here, which is slow for text that isn't ASCII
+    if not keep_newlines:
+        paragraph = paragraph.replace("\n", " ")
+    return paragraph.replace("\u2019", "'").replace("\u2013", "-")
\ No newline at end of file
@@ -0,0 +1,257 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+import glob
+import json
+import os
+import socket
+import sqlite3
+import time
+from typing import TYPE_CHECKING
+
+from dead_letter import DeadLetters, dead_letter_path
+from defaults import DEFAULT_BATCH_SIZE, DEFAULT_LEASE
+from export_writer import JSONLinesWriter, export_path, open_export
+from incremental import row_url
+
+if TYPE_CHECKING:
+    from fetcher import Fetcher
+# seconds an idle worker waits before looking for expired leases again
+POLL_INTERVAL = 5
+
+
+@dataclass
+class Task:
+    id: int
+    type_grab: str
+    row: dict[str, str]
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkQueue:
+    """
+    The rows of the index pages to scrape, in a SQLite file shared by any number
+    of workers, processes or machines with access to the same file.
+
+    Workers claim batches of rows with a lease. A row is done once its worker
+    completes it, and a row whose lease expired before that, e.g. because its
+    worker crashed, can be claimed again by any worker.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                type TEXT NOT NULL,
+                url TEXT NOT NULL,
+                row TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (type, url)
+            )""")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS tasks_claimable ON tasks (done, lease_expires)")
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs the block in a transaction holding the write lock of the file from the start.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def fill(self, type_grab: str, rows: list[dict[str, str]]) -> int:
+        """
+        Adds the rows of an index page, in order. Rows already in the queue are kept as they are.
+
+        Returns:
+            int: The number of rows added
+        """
+        with self._transaction():
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO tasks (type, url, row) VALUES (?, ?, ?)",
+                [(type_grab, row_url(row), json.dumps(row)) for row in rows])
+            return self._db.total_changes - before
+
+    def claim(self, worker: str, batch_size: int = DEFAULT_BATCH_SIZE,
+              lease: float = DEFAULT_LEASE) -> list[Task]:
+        """
+        Leases up to `batch_size` rows that are neither done nor leased to another worker.
+
+        Returns:
+            list[Task]: The claimed rows, empty when there is nothing to claim right now
+        """
+        now = time.time()
+        with self._transaction():
+            claimed = self._db.execute("""
+                UPDATE tasks SET worker = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM tasks
+                    WHERE done = 0 AND (lease_expires IS NULL OR lease_expires < ?)
+                    ORDER BY id LIMIT ?)
+                RETURNING id, type, row""", (worker, now + lease, now, batch_size)).fetchall()
+        return sorted((Task(task_id, type_grab, json.loads(row)) for task_id, type_grab, row in claimed),
+                      key=lambda task: task.id)
+
+    def complete(self, worker: str, tasks: list[Task]) -> None:
+        """
+        Marks rows as done, unless their lease was lost to another worker in the meantime.
+        """
+        with self._transaction():
+            self._db.executemany("UPDATE tasks SET done = 1 WHERE id = ? AND worker = ?",
+                                 [(task.id, worker) for task in tasks])
+
+    def status(self) -> dict[str, dict[str, int]]:
+        """
+        Counts the rows of every content type that are done, leased and waiting.
+        """
+        now = time.time()
+        counts = {}
+        for type_grab, done, leased, total in self._db.execute("""
+                SELECT type, SUM(done), SUM(done = 0 AND lease_expires IS NOT NULL AND lease_expires >= ?), COUNT(*)
+                FROM tasks GROUP BY type""", (now,)):
+            counts[type_grab] = {"done": done, "leased": leased,
+                                 "waiting": total - done - leased}
+        return counts
+
+    def remaining(self) -> int:
+        (remaining,) = self._db.execute("SELECT COUNT(*) FROM tasks WHERE done = 0").fetchone()
+        return remaining
+
+    def urls(self, type_grab: str) -> list[str]:
+        """
+        Gets the urls of a content type in the order of its index page.
+        """
+        return [url for (url,) in self._db.execute(
+            "SELECT url FROM tasks WHERE type = ? ORDER BY id", (type_grab,))]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def shards_path(queue_path: str) -> str:
+    """
+    Gets the directory the workers of a queue write their shards to, e.g. `crawl.shards`.
+    """
+    root, _ = os.path.splitext(queue_path)
+    return f'{root}.shards'
+
+
+def run_worker(queue: WorkQueue, fetcher: "Fetcher", shard_dir: str, worker: (str | None) = None,
+               batch_size: int = DEFAULT_BATCH_SIZE, lease: float = DEFAULT_LEASE) -> int:
+    """
+    Scrapes batches claimed from the queue until every row is done. Records are
+    appended to one JSON Lines shard per content type and worker, and a batch is
+    only completed once its records are written, so a worker that stops only
+    loses the batch it was working on. Rows that fail are done as well, they are
+    kept in a dead-letter file next to the shard.
+
+    Args:
+        queue: The queue to work on
+        fetcher: The fetcher used to request the pages
+        shard_dir: The directory of the shards, shared by the workers
+        worker: A name unique to this worker, defaults to the host name and pid
+        batch_size: Number of rows claimed at a time
+        lease: Seconds a worker has to finish a batch
+
+    Returns:
+        int: The number of records written by this worker
+    """
+    # the content modules are only loaded by the commands scraping them
+    from dnd_scraper import CONTENT_TYPES
+    worker = worker or default_worker_id()
+    os.makedirs(shard_dir, exist_ok=True)
+    shards: dict[str, JSONLinesWriter] = {}
+    dead_letters: dict[str, DeadLetters] = {}
+    written = 0
+
+    def scrape_task(task: Task) -> (str | None):
+        try:
+            return CONTENT_TYPES[task.type_grab][2](task.row, fetcher=fetcher).to_json_str()
+        except Exception as e:
+            failed_path = os.path.join(shard_dir, f'{task.type_grab}.{worker}.failed.jsonl')
+            dead_letters.setdefault(task.type_grab, DeadLetters(failed_path)).add(task.row, e)
+            return None
+
+    try:
+        while True:
+            tasks = queue.claim(worker, batch_size, lease)
+            if not tasks:
+                if not queue.remaining():
+                    return written
+                # the rest is leased to other workers, their leases may still expire
+                time.sleep(POLL_INTERVAL)
+                continue
+            for task, record in zip(tasks, fetcher.map(scrape_task, tasks)):
+                if record is None:
+                    continue
+                shard = shards.get(task.type_grab)
+                if shard is None:
+                    shard_path = os.path.join(shard_dir, f'{task.type_grab}.{worker}.jsonl')
+                    shard = shards[task.type_grab] = JSONLinesWriter(shard_path, resume=True)
+                shard.write(row_url(task.row), record)
+                written += 1
+            queue.complete(worker, tasks)
+    finally:
+        for shard in shards.values():
+            shard.close()
+        for failed in dead_letters.values():
+            failed.finish()
+
+
+def merge_shards(queue: WorkQueue, shard_dir: str, output_format: str = "json",
+                 output_dir: (str | None) = None) -> dict[str, int]:
+    """
+    Merges the shards of every content type into its standard export, with the
+    records in the order of the index. A record written by more than one worker
+    is only kept once. Rows that failed on every worker that tried them go to the
+    dead-letter file of the export, for `--retry-failed`.
+
+    Returns:
+        dict[str, int]: The number of records of every merged content type
+    """
+    from dnd_scraper import CONTENT_TYPES
+    merged = {}
+    for type_grab in queue.status():
+        records = {}
+        for shard_path in sorted(glob.glob(os.path.join(glob.escape(shard_dir), f'{type_grab}.*.jsonl'))):
+            if shard_path.endswith(".failed.jsonl"):
+                continue
+            with open(shard_path, encoding="utf-8") as shard:
+                for line in shard:
+                    # a partial last line is from a worker that stopped, its row was claimed again
+                    if line.endswith("\n"):
+                        record = line[:-1]
+                        records[json.loads(record)["url"]] = record
+        path = export_path(CONTENT_TYPES[type_grab][1], output_format, output_dir)
+        urls = queue.urls(type_grab)
+        writer = open_export(path, output_format)
+        try:
+            for url in urls:
+                if url in records:
+                    writer.write(url, records[url])
+            writer.finish()
+        finally:
+            writer.close()
+
+        failed = {}
+        for failed_path in glob.glob(os.path.join(glob.escape(shard_dir), f'{type_grab}.*.failed.jsonl')):
+            failed.update(DeadLetters(failed_path).entries)
+        positions = {url: i for i, url in enumerate(urls)}
+        DeadLetters(dead_letter_path(path)).update(
+            dict(entry, position=positions.get(url)) for url, entry in failed.items() if url not in records)
+        merged[type_grab] = len(writer.written)
+    return merged